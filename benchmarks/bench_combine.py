@@ -0,0 +1,71 @@
+"""Measures how quickly tokens from comment heavy headers are combined.
+
+Run with ``python -m benchmarks.bench_combine``. The time spent dedenting
+is also compared against the ``textwrap.dedent`` round trip mrst used to
+make for each block.
+"""
+import argparse
+import textwrap
+import time
+import typing as t
+
+from mrst import cpp
+
+from .trees import make_commented_header
+from .trees import no_includes
+
+
+def _textwrap_dedent(lines: t.List[str]) -> t.List[str]:
+    return textwrap.dedent("\n".join(lines)).strip().split("\n")
+
+
+def _best(repeat: int, f: t.Callable[[], t.Any]) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--blocks", type=int, default=2000)
+    parser.add_argument("--comment-lines", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    lines = make_commented_header(args.blocks, args.comment_lines)
+    tokens = cpp.parse_source(lines, no_includes)
+    blocks = [
+        [line for tok in group for line in tok.text]
+        for group in _text_runs(tokens)
+    ]
+
+    combine = _best(args.repeat, lambda: cpp.create_super_tokens(tokens))
+    print(f"{len(lines)} lines, best of {args.repeat}")
+    rate = len(lines) / combine
+    print(f"combine:          {combine:.3f}s {rate:>12,.0f} lines/sec")
+    for name, dedent in [
+        ("dedent_lines", cpp.dedent_lines),
+        ("textwrap.dedent", _textwrap_dedent),
+    ]:
+        took = _best(args.repeat, lambda: [dedent(b) for b in blocks])
+        print(f"{name + ':':<17} {took:.3f}s for {len(blocks)} blocks")
+
+
+def _text_runs(tokens: t.List[cpp.Token]) -> t.Iterator[t.List[cpp.Token]]:
+    """Groups consecutive section text tokens, as the combiner does."""
+    run: t.List[cpp.Token] = []
+    for tok in tokens:
+        if tok.type == cpp.TokenType.SECTION_TEXT:
+            run.append(tok)
+        elif run:
+            yield run
+            run = []
+    if run:
+        yield run
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Measures the memory held by the C++ translator's tokens.
+
+Run with ``python -m benchmarks.bench_memory``.
+"""
+import argparse
+import gc
+import tracemalloc
+import typing as t
+
+from mrst import cpp
+
+from .trees import make_header
+from .trees import no_includes
+
+
+def retained(build: t.Callable[[], t.Any]) -> t.Tuple[int, t.Any]:
+    """Returns how many bytes the result of build holds on to."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, result
+
+
+def _report(name: str, count: int, size: int, lines: int) -> None:
+    print(
+        f"{name + ':':<14}{count:>8} {size / 1024:>10,.0f} KiB "
+        f"{size / lines:>6.1f} bytes/line"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--blocks", type=int, default=5000)
+    args = parser.parse_args()
+
+    lines = make_header(args.blocks)
+    token_bytes, tokens = retained(
+        lambda: cpp.parse_source(lines, no_includes)
+    )
+    super_bytes, super_tokens = retained(
+        lambda: cpp.create_super_tokens(tokens)
+    )
+    print(f"{len(lines)} lines")
+    _report("tokens", len(tokens), token_bytes, len(lines))
+    _report("super tokens", len(super_tokens), super_bytes, len(lines))
+
+
+if __name__ == "__main__":
+    main()
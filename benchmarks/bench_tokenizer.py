@@ -0,0 +1,36 @@
+"""Measures how many lines per second the C++ tokenizer gets through.
+
+Run with ``python -m benchmarks.bench_tokenizer``.
+"""
+import argparse
+import time
+import typing as t
+
+from mrst import cpp
+
+from .trees import make_header
+from .trees import no_includes
+
+
+def tokenize(lines: t.List[str]) -> int:
+    return len(cpp.parse_source(lines, no_includes))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--blocks", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    lines = make_header(args.blocks)
+    best = float("inf")
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        tokenize(lines)
+        best = min(best, time.perf_counter() - start)
+    print(f"{len(lines)} lines, best of {args.repeat}: {best:.3f}s")
+    print(f"{len(lines) / best:,.0f} lines/sec")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""Times each stage of the generate pipeline on a synthetic doc tree.
+
+Run with ``python -m benchmarks.run``. Results are written as JSON, either
+to stdout or to ``--output``. Passing an earlier results file to
+``--compare`` prints how much each stage changed since then.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import typing as t
+
+from mrst import cpp, files, gen
+
+from . import trees
+
+
+RESULTS_VERSION = 1
+
+Stage = t.Callable[[], t.Any]
+
+
+def _time(stage: Stage, repeat: int) -> t.List[float]:
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        stage()
+        runs.append(time.perf_counter() - start)
+    return runs
+
+
+def _summarize(runs: t.List[float], lines: int) -> t.Dict[str, t.Any]:
+    best = min(runs)
+    return {
+        "runs": runs,
+        "best": best,
+        "median": statistics.median(runs),
+        "lines": lines,
+        "lines_per_sec": lines / best if best else None,
+    }
+
+
+@contextlib.contextmanager
+def _stub_pandoc(tree: trees.Tree) -> t.Iterator[None]:
+    old_path = os.environ.get("PATH", "")
+    os.environ["PATH"] = tree.bin_dir + os.pathsep + old_path
+    try:
+        yield
+    finally:
+        os.environ["PATH"] = old_path
+
+
+def run_benchmarks(
+    tree: trees.Tree, repeat: int, jobs: int
+) -> t.Dict[str, t.Dict[str, t.Any]]:
+    # The translation stages read through a warm cache so they measure the
+    # work itself rather than the disk.
+    file_cache = files.FileCache()
+    sources = [
+        (file_cache.read_lines(h), gen.FileReader(h, file_cache=file_cache))
+        for h in tree.headers
+    ]
+
+    def tokenize() -> t.List[t.List[cpp.Token]]:
+        return [cpp.parse_source(lines, reader) for lines, reader in sources]
+
+    tokens = tokenize()
+
+    def combine() -> t.List[t.List[cpp.SuperToken]]:
+        return [cpp.create_super_tokens(ts) for ts in tokens]
+
+    super_tokens = combine()
+
+    def render() -> None:
+        for sts in super_tokens:
+            for _ in cpp.iter_rst(sts, None):
+                pass
+
+    output = os.path.join(tree.root, "output")
+
+    def generate(incremental: bool) -> Stage:
+        def stage() -> None:
+            config = gen.Config(
+                tree.source, output, incremental=incremental, jobs=jobs
+            )
+            if gen.generate(config) != 0:
+                raise RuntimeError("generate failed")
+
+        return stage
+
+    results = {
+        "tokenize": _summarize(_time(tokenize, repeat), tree.lines),
+        "combine": _summarize(_time(combine, repeat), tree.lines),
+        "render": _summarize(_time(render, repeat), tree.lines),
+    }
+    with _stub_pandoc(tree):
+        results["generate"] = _summarize(
+            _time(generate(False), repeat), tree.lines
+        )
+        # Nothing changes between runs, so this is the cost of checking
+        # that everything is up to date.
+        results["generate_incremental"] = _summarize(
+            _time(generate(True), repeat), tree.lines
+        )
+    return results
+
+
+def compare(
+    old: t.Dict[str, t.Any], new: t.Dict[str, t.Any]
+) -> t.Iterator[str]:
+    """Describes how each stage's best time changed between two results."""
+    for name, result in new["results"].items():
+        previous = old["results"].get(name)
+        if previous is None:
+            yield f"{name:<22} {result['best']:.4f}s (new)"
+            continue
+        change = 100.0 * (result["best"] - previous["best"]) / previous["best"]
+        yield (
+            f"{name:<22} {previous['best']:.4f}s -> {result['best']:.4f}s "
+            f"({change:+.1f}%)"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--mrst-files", type=int, default=50)
+    parser.add_argument("--headers", type=int, default=20)
+    parser.add_argument("--header-lines", type=int, default=1000)
+    parser.add_argument("--include-depth", type=int, default=2)
+    parser.add_argument("--markdown-files", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("-j", "--jobs", type=int, default=1)
+    parser.add_argument("--output", help="file to write the JSON results to")
+    parser.add_argument(
+        "--compare", help="earlier results to print a comparison with"
+    )
+    args = parser.parse_args()
+
+    spec = trees.TreeSpec(
+        mrst_files=args.mrst_files,
+        headers=args.headers,
+        header_lines=args.header_lines,
+        include_depth=args.include_depth,
+        markdown_files=args.markdown_files,
+    )
+    with tempfile.TemporaryDirectory(prefix="mrst-bench") as root:
+        tree = trees.make_tree(root, spec)
+        # mrst reports progress on stdout, which is where the results go.
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = run_benchmarks(tree, args.repeat, args.jobs)
+
+    report = {
+        "version": RESULTS_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "tree": spec.to_dict(),
+        "repeat": args.repeat,
+        "jobs": args.jobs,
+        "results": results,
+    }
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as w:
+            w.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, "r") as r:
+            old = json.load(r)
+        for line in compare(old, report):
+            print(line, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
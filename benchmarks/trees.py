@@ -0,0 +1,197 @@
+"""Builds synthetic doc trees for the benchmarks."""
+import os
+import stat
+import sys
+import typing as t
+
+# Roughly how many lines make_header writes per block.
+LINES_PER_BLOCK = 23
+
+STUB_PANDOC = """#!{python}
+# Stands in for pandoc: Markdown paragraphs are passed through as rst.
+import sys
+
+
+if "--version" in sys.argv:
+    print("pandoc-stub 0.0")
+else:
+    sys.stdout.write(sys.stdin.read())
+"""
+
+
+def make_header(blocks: int, see_file: t.Optional[str] = None) -> t.List[str]:
+    """Makes a header full of documented functions and classes.
+
+    If see_file is given the header's intro pulls it in with ~see-file.
+    """
+    lines = [
+        "// --------------------------------------------------",
+        "// Generated API",
+        "// ==================================================",
+        "//     Lots of things live here.",
+    ]
+    if see_file:
+        lines.append(f'// ~see-file "{see_file}"')
+    lines += [
+        "// -------------------------------------------------/",
+        "",
+        "#include <string>",
+        "",
+    ]
+    for i in range(blocks):
+        lines += [
+            "// --------------------------------------------------",
+            f"// class Widget{i}",
+            "// --------------------------------------------------",
+            f"//     Widget number {i} does widget things.",
+            "//     Its methods are listed below.",
+            "// --------------------------------------------------",
+            f"class Widget{i} {{",
+            "public:",
+            f"    Widget{i}();",
+            "    int size() const;",
+            "",
+            "    void resize(int new_size);",
+            "};",
+            "",
+            "// --------------------------------------------------",
+            f"// int make_widget_{i}(const std::string & name);",
+            "// --------------------------------------------------",
+            "//     Returns a widget's id.",
+            "// --------------------------------------------------",
+            f"int make_widget_{i}(const std::string & name);",
+            "",
+            "// ~end-doc",
+            "",
+        ]
+    return lines
+
+
+def no_includes(*_args: t.Any, **_kwargs: t.Any) -> t.Any:
+    """The include reader for headers with no ~see-file in them."""
+    raise AssertionError("The benchmark header has no includes.")
+
+
+def make_commented_header(blocks: int, comment_lines: int = 20) -> t.List[str]:
+    """Makes a header where long, indented comments outweigh the code."""
+    lines = []
+    for i in range(blocks):
+        lines += [
+            "// --------------------------------------------------",
+            f"// void process_{i}(Widget & widget);",
+            "// --------------------------------------------------",
+        ]
+        for j in range(comment_lines):
+            if j % 5 == 4:
+                lines.append("//")
+            else:
+                indent = "    " if j % 5 else "        "
+                lines.append(
+                    f"// {indent}Line {j} of the notes on process_{i}."
+                )
+        lines += [
+            "// --------------------------------------------------",
+            f"void process_{i}(Widget & widget);",
+            "",
+            "// ~end-doc",
+            "",
+        ]
+    return lines
+
+
+def make_markdown(index: int, paragraphs: int) -> t.List[str]:
+    lines = [f"# Notes {index}", ""]
+    for i in range(paragraphs):
+        lines += [
+            f"Paragraph {i} of the notes has *some* emphasis and `code`.",
+            "",
+        ]
+    return lines
+
+
+class TreeSpec:
+    """How big a synthetic tree should be."""
+
+    def __init__(
+        self,
+        mrst_files: int = 50,
+        headers: int = 20,
+        header_lines: int = 1000,
+        include_depth: int = 2,
+        markdown_files: int = 10,
+    ) -> None:
+        self.mrst_files = mrst_files
+        self.headers = headers
+        self.header_lines = header_lines
+        # How many headers each header pulls in through a ~see-file chain.
+        self.include_depth = include_depth
+        self.markdown_files = markdown_files
+
+    def to_dict(self) -> t.Dict[str, int]:
+        return dict(vars(self))
+
+
+class Tree:
+    """The files written by make_tree."""
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+        self.source = os.path.join(root, "source")
+        self.bin_dir = os.path.join(root, "bin")
+        self.headers: t.List[str] = []
+        self.mrst_files: t.List[str] = []
+        self.lines = 0
+
+
+def _write(path: str, lines: t.List[str]) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as w:
+        w.write("\n".join(lines) + "\n")
+
+
+def write_stub_pandoc(bin_dir: str) -> str:
+    """Writes a pandoc executable which runs instantly."""
+    os.makedirs(bin_dir, exist_ok=True)
+    path = os.path.join(bin_dir, "pandoc")
+    with open(path, "w") as w:
+        w.write(STUB_PANDOC.format(python=sys.executable))
+    os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+    return path
+
+
+def make_tree(root: str, spec: TreeSpec) -> Tree:
+    tree = Tree(root)
+    _write(os.path.join(tree.source, "conf.py"), ['project = "benchmark"'])
+    blocks = max(1, spec.header_lines // LINES_PER_BLOCK)
+    include_dir = os.path.join(tree.source, "include")
+    for h in range(spec.headers):
+        # header_N.hpp -> header_N_1.hpp -> ... -> header_N_<depth>.hpp
+        names = [f"header_{h}.hpp"] + [
+            f"header_{h}_{d}.hpp" for d in range(1, spec.include_depth + 1)
+        ]
+        for d, name in enumerate(names):
+            see_file = names[d + 1] if d + 1 < len(names) else None
+            lines = make_header(blocks if d == 0 else 2, see_file)
+            _write(os.path.join(include_dir, name), lines)
+            tree.lines += len(lines)
+        tree.headers.append(os.path.join(include_dir, names[0]))
+
+    for m in range(spec.markdown_files):
+        lines = make_markdown(m, 10)
+        _write(os.path.join(tree.source, "notes", f"notes_{m}.md"), lines)
+
+    for i in range(spec.mrst_files):
+        lines = [f"Page {i}", "=" * len(f"Page {i}"), ""]
+        if spec.headers:
+            lines.append(f'~dumpfile "include/header_{i % spec.headers}.hpp"')
+            lines.append("")
+        if spec.markdown_files:
+            md = i % spec.markdown_files
+            lines.append(f'~dumpfile "notes/notes_{md}.md"')
+            lines.append("")
+        path = os.path.join(tree.source, f"page_{i}.mrst")
+        _write(path, lines)
+        tree.mrst_files.append(path)
+
+    write_stub_pandoc(tree.bin_dir)
+    return tree
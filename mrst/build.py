@@ -1,11 +1,71 @@
+import logging
+import os
 import subprocess
+import typing as t
 
 from . import gen
 
 
+logger = logging.getLogger(__name__)
+
+
+def _parallel(jobs: t.Optional[str]) -> int:
+    if not jobs:
+        return 0
+    if jobs == "auto":
+        return os.cpu_count() or 1
+    return int(jobs)
+
+
+def sphinx_command(config: gen.Config, op: str = "html") -> t.List[str]:
+    cmd = ["sphinx-build", "-M", op, config.gen_source_dir, config.build_dir]
+    if config.sphinx_jobs:
+        cmd += ["-j", config.sphinx_jobs]
+    for name, value in sorted(config.sphinx_overrides.items()):
+        cmd += ["-D", f"{name}={value}"]
+    return cmd
+
+
+def _sphinx_in_process(config: gen.Config, op: str) -> t.Optional[int]:
+    """Runs Sphinx's application directly, or returns None if it can't.
+
+    The output and doctrees go where ``sphinx-build -M`` puts them, so the
+    two ways of building share the saved environment and Sphinx only
+    re-reads the pages which changed. Sphinx's errors are reported with
+    the status ``sphinx-build`` would exit with.
+    """
+    try:
+        from sphinx.application import Sphinx
+        from sphinx.errors import SphinxError
+    except ImportError:
+        logger.warning("Sphinx can't be imported; running sphinx-build")
+        return None
+
+    with config.tracer.span("sphinx", "phase", op=op):
+        try:
+            app = Sphinx(
+                srcdir=config.gen_source_dir,
+                confdir=config.gen_source_dir,
+                outdir=os.path.join(config.build_dir, op),
+                doctreedir=os.path.join(config.build_dir, "doctrees"),
+                buildername=op,
+                confoverrides=dict(config.sphinx_overrides),
+                parallel=_parallel(config.sphinx_jobs),
+            )
+            app.build()
+        except SphinxError as e:
+            logger.error("%s: %s", e.category, e)
+            return 2
+    return t.cast(int, app.statuscode)
+
+
 def sphinx_build(config: gen.Config, op: str = "html") -> int:
-    cmd = f"sphinx-build -M {op} {config.gen_source_dir} {config.build_dir}"
-    return subprocess.call(cmd, shell=True)
+    if config.sphinx_in_process:
+        result = _sphinx_in_process(config, op)
+        if result is not None:
+            return result
+    with config.tracer.span("sphinx-build", "subprocess", op=op):
+        return subprocess.call(sphinx_command(config, op))
 
 
 def build(config: gen.Config) -> int:
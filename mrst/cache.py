@@ -0,0 +1,98 @@
+import hashlib
+import os
+import tempfile
+import typing as t
+
+
+DEFAULT_MAX_SIZE = 100 * 1024 * 1024
+
+
+class DiskCache:
+    """A content-addressed store of text entries kept in a directory.
+
+    Entries live in files named after their keys. Reading an entry bumps
+    its mtime, so ``prune`` can evict the least recently used entries
+    first once the total size goes over ``max_size``.
+    """
+
+    def __init__(
+        self, directory: str, max_size: int = DEFAULT_MAX_SIZE
+    ) -> None:
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(*parts: str) -> str:
+        h = hashlib.sha256()
+        for part in parts:
+            h.update(part.encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key: str) -> t.Optional[str]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as r:
+                text = r.read()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return text
+
+    def put(self, key: str, text: str) -> None:
+        path = self._path(key)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # Written to a temp file first so concurrent readers never see a
+        # partial entry.
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as w:
+                w.write(text)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def prune(self) -> int:
+        """Evicts least recently used entries until under the size limit.
+
+        Returns the number of entries removed.
+        """
+        entries: t.List[t.Tuple[float, int, str]] = []
+        total = 0
+        try:
+            subdirs = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return 0
+        for subdir in subdirs:
+            if not subdir.is_dir():
+                continue
+            for entry in os.scandir(subdir.path):
+                if entry.name.startswith("."):
+                    continue
+                st = entry.stat()
+                entries.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        return removed
@@ -1,9 +1,17 @@
 import argparse
+import os
 import sys
 import typing as t
 
 from . import build
+from . import cache
+from . import deps
 from . import gen
+from . import logs
+from . import procs
+from . import serve
+from . import trace
+from . import watch
 
 
 def run(args: t.List[str]) -> int:
@@ -23,13 +31,222 @@ def run(args: t.List[str]) -> int:
         default=False,
         help="If set, generate only, don't call Sphinx.",
     )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        default=False,
+        help="Only regenerate files whose inputs changed since the last run.",
+    )
+    parser.add_argument(
+        "--affected-by",
+        action="append",
+        metavar="PATH",
+        help="Print the docs which include the given file, according to the "
+        "last run, and exit. May be given more than once.",
+    )
+    parser.add_argument(
+        "--sync",
+        action="store_true",
+        default=False,
+        help="Instead of wiping the generated directory on a full run, "
+        "leave files which haven't changed alone and hard link rst files "
+        "where possible.",
+    )
+    parser.add_argument(
+        "--skip-excluded",
+        action="store_true",
+        default=False,
+        help="Don't copy files matching exclude_patterns in conf.py to the "
+        "generated directory either. They're copied by default since "
+        "Sphinx skips them itself, but they may still be pulled in with "
+        ".. include::.",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Number of processes used to generate files. 0 means one per "
+        "CPU.",
+    )
+    parser.add_argument(
+        "--max-subprocesses",
+        type=int,
+        default=procs.DEFAULT_LIMIT,
+        metavar="N",
+        help="How many pandoc and git processes may run at once. They run "
+        "alongside the generation of other files. Defaults to one per CPU.",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        default=None,
+        help="Where converted Markdown is cached between runs. Defaults to "
+        "a directory inside the output directory.",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=cache.DEFAULT_MAX_SIZE // (1024 * 1024),
+        metavar="MB",
+        help="Maximum size of the cache. 0 turns caching off.",
+    )
+    parser.add_argument(
+        "--max-include-depth",
+        type=int,
+        default=gen.DEFAULT_MAX_INCLUDE_DEPTH,
+        metavar="N",
+        help="How deeply // ~see-file directives may nest before giving up.",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        default=False,
+        help="Print how long each phase took and the slowest files, "
+        "directives and subprocesses.",
+    )
+    parser.add_argument(
+        "--trace-file",
+        type=str,
+        default=None,
+        metavar="PATH",
+        help="Write a Chrome trace of the build (viewable in "
+        "chrome://tracing or Perfetto) to the given file.",
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="count",
+        default=0,
+        help="Log more about what's happening. Give twice for debug output.",
+    )
+    parser.add_argument(
+        "-q",
+        "--quiet",
+        action="count",
+        default=0,
+        help="Only log errors.",
+    )
+    parser.add_argument(
+        "--log-format",
+        choices=["text", "json"],
+        default="text",
+        help="Log as plain text or as one JSON object per line.",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        default=False,
+        help="Keep running, rebuilding the docs affected by each change to "
+        "the source tree or any file it includes. Stop with Ctrl+C.",
+    )
+    parser.add_argument(
+        "--watch-interval",
+        type=float,
+        default=watch.DEFAULT_INTERVAL,
+        metavar="SECONDS",
+        help="How often --watch checks for changes.",
+    )
+    parser.add_argument(
+        "--serve",
+        type=str,
+        default=None,
+        metavar="SOCKET",
+        help="Keep running, answering generate and translate requests sent "
+        "as lines of JSON to a Unix socket at the given path. Caches stay "
+        "warm between requests.",
+    )
+    parser.add_argument(
+        "--sphinx-in-process",
+        action="store_true",
+        default=False,
+        help="Run Sphinx inside mrst rather than starting sphinx-build. "
+        "Sphinx must be importable by mrst's Python.",
+    )
+    parser.add_argument(
+        "--sphinx-jobs",
+        type=str,
+        default=None,
+        metavar="N",
+        help='Number of processes Sphinx reads files with, or "auto" for '
+        "one per CPU (Sphinx's -j).",
+    )
+    parser.add_argument(
+        "--sphinx-define",
+        action="append",
+        default=[],
+        metavar="NAME=VALUE",
+        help="Override a setting from conf.py (Sphinx's -D). May be given "
+        "more than once.",
+    )
     p_args = parser.parse_args(args)
+    sphinx_overrides = {}
+    for define in p_args.sphinx_define:
+        name, equals, value = define.partition("=")
+        if not equals:
+            parser.error(f"--sphinx-define expects NAME=VALUE, got {define}")
+        sphinx_overrides[name] = value
+    verbosity = p_args.verbose - p_args.quiet
+    if p_args.watch and not p_args.quiet:
+        # Say what's being rebuilt.
+        verbosity = max(verbosity, 1)
+    logs.configure(verbosity, json_format=p_args.log_format == "json")
 
-    cfg = gen.Config(p_args.source, p_args.output)
-    if p_args.skip_sphinx:
-        return gen.generate(cfg)
+    cfg = gen.Config(
+        p_args.source,
+        p_args.output,
+        incremental=p_args.incremental,
+        sync=p_args.sync,
+        skip_excluded=p_args.skip_excluded,
+        max_include_depth=p_args.max_include_depth,
+        subprocess_limit=p_args.max_subprocesses,
+        jobs=p_args.jobs or os.cpu_count() or 1,
+        cache_dir=p_args.cache_dir,
+        cache_size=p_args.cache_size * 1024 * 1024,
+        tracer=trace.Tracer(p_args.profile or bool(p_args.trace_file)),
+        sphinx_in_process=p_args.sphinx_in_process,
+        sphinx_jobs=p_args.sphinx_jobs,
+        sphinx_overrides=sphinx_overrides,
+    )
+    if p_args.affected_by:
+        graph = deps.DependencyGraph.load(cfg.deps_file)
+        affected = {
+            doc
+            for path in p_args.affected_by
+            for doc in graph.affected_by(path)
+        }
+        for doc in sorted(affected):
+            print(os.path.relpath(doc))
+        return 0
+
+    if p_args.serve:
+        try:
+            serve.serve(cfg, p_args.serve, run_sphinx=not p_args.skip_sphinx)
+        except KeyboardInterrupt:
+            pass
+        result = 0
+    elif p_args.watch:
+        try:
+            watch.watch(
+                cfg,
+                gen.generate if p_args.skip_sphinx else build.build,
+                interval=p_args.watch_interval,
+            )
+        except KeyboardInterrupt:
+            pass
+        result = 0
+    elif p_args.skip_sphinx:
+        result = gen.generate(cfg)
     else:
-        return build.build(cfg)
+        result = build.build(cfg)
+
+    if p_args.trace_file:
+        cfg.tracer.write_chrome_trace(p_args.trace_file)
+    if p_args.profile:
+        for line in cfg.tracer.summary():
+            print(line, file=sys.stderr)
+    return result
 
 
 def main() -> None:
@@ -1,3 +1,6 @@
+import functools
+import logging
+import re
 import typing as t
 import typing_extensions as te
 
@@ -15,50 +18,68 @@ IncludeFileArgs = te.TypedDict(
     },
 )
 
+logger = logging.getLogger(__name__)
+
 
 def make_include_reg(prefix: str) -> str:
     return f"{prefix} "  # "([^"]*)" ?(.*)$'
 
 
-def _split_args(args: str) -> t.List[str]:
-    index = 0
-    result = []
-    while index < len(args):
-        while len(args) > index and args[index] == " ":
-            index += 1
+# Directive arguments are "=", a quoted string, or a run of anything else up
+# to a space or "=". Inside quotes \" stands for a quote; a quoted string
+# missing its closing quote runs to the end of the line.
+_ARG_RE = re.compile(r' *(?:(=)|"((?:\\"|[^"])*)"?|([^ =]+))')
 
-        if len(args) <= index:
-            break
+# How many distinct argument strings parse_include_args remembers.
+_CACHE_SIZE = 1024
 
-        if args[index] == "=":
-            result.append("=")
-            index += 1
-        elif args[index] == '"':
-            index += 1
-            start_index = index
-            while len(args) > index and args[index] != '"':
-                if args[index] == "\\":
-                    if len(args) > index + 1 and args[index + 1] == '"':
-                        index += 2
-                else:
-                    index += 1
-            result.append(args[start_index:index].replace('\\"', '"'))
-            index += 1
-        else:
-            start_index = index
-            while len(args) > index and args[index] not in [" ", "="]:
-                index += 1
-            result.append(args[start_index:index])
 
+class IncludeArgs(t.NamedTuple):
+    """The parsed arguments of a ~dumpfile or ~see-file directive."""
+
+    input_file: str
+    start: t.Optional[int]
+    end: t.Optional[int]
+    indent: t.Optional[int]
+    section: t.Optional[str]
+    start_after: t.Optional[str]
+    end_before: t.Optional[str]
+
+    def as_dict(self) -> IncludeFileArgs:
+        return {
+            "input_file": self.input_file,
+            "start": self.start,
+            "end": self.end,
+            "indent": self.indent,
+            "section": self.section,
+            "start_after": self.start_after,
+            "end_before": self.end_before,
+        }
+
+
+def _split_args(args: str) -> t.List[str]:
+    result = []
+    for match in _ARG_RE.finditer(args):
+        equals, quoted, bare = match.groups()
+        if quoted is not None:
+            result.append(quoted.replace('\\"', '"'))
+        else:
+            result.append(equals or bare)
     return result
 
 
-def parse_include_file_args(input: str) -> IncludeFileArgs:
-    # rest = matches.groups()
+@functools.lru_cache(maxsize=_CACHE_SIZE)
+def parse_include_args(input: str) -> IncludeArgs:
+    """Parses the arguments following a ~dumpfile or ~see-file directive.
+
+    The same directive tends to show up over and over again, so results
+    are cached by the argument string. They're immutable so they can be
+    shared safely.
+    """
     args = _split_args(input.strip())
     if len(args) < 1:
         raise ValueError("Expected at least one arg.")
-    print(f"args={args}")
+    logger.debug("args=%s", args)
     input_file = args[0]
     kwargs: t.Dict[str, t.Optional[str]] = {
         "start": None,
@@ -109,12 +130,17 @@ def parse_include_file_args(input: str) -> IncludeFileArgs:
         else:
             return int(arg_value)
 
-    return {
-        "input_file": input_file,
-        "start": intify(kwargs["start"]),
-        "end": intify(kwargs["end"]),
-        "indent": intify(kwargs["indent"]),
-        "section": kwargs["section"],
-        "start_after": kwargs["start_after"],
-        "end_before": kwargs["end_before"],
-    }
+    return IncludeArgs(
+        input_file=input_file,
+        start=intify(kwargs["start"]),
+        end=intify(kwargs["end"]),
+        indent=intify(kwargs["indent"]),
+        section=kwargs["section"],
+        start_after=kwargs["start_after"],
+        end_before=kwargs["end_before"],
+    )
+
+
+def parse_include_file_args(input: str) -> IncludeFileArgs:
+    # The dict is new each time, so callers are free to change it.
+    return parse_include_args(input).as_dict()
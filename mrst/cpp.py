@@ -1,4 +1,7 @@
+import collections
 from enum import Enum
+import itertools
+import os
 import re
 import textwrap
 import typing as t
@@ -19,6 +22,8 @@ FileReader = t.Callable[..., t.Tuple[t.List[str], t.Any]]
 class Line(object):
     """Represents a line of text."""
 
+    __slots__ = ("line",)
+
     def __init__(self, line: str) -> None:
         self.line = line
 
@@ -88,15 +93,43 @@ class TokenType(Enum):
     SEE_FILE = 7
 
 
-class Token(object):
+class _HasText(object):
+    """Holds the lines of a token.
+
+    There's a token for nearly every line of a header, so a single line
+    is kept as it is rather than in a list of its own. ``text`` always
+    gives a list.
+    """
+
+    __slots__ = ("_text",)
+
+    _text: t.Union[str, t.List[str]]
+
+    @property
+    def text(self) -> t.List[str]:
+        text = self._text
+        return [text] if isinstance(text, str) else text
+
+    def add_text_to(self, lines: t.List[str]) -> None:
+        """Appends the token's lines to a list."""
+        text = self._text
+        if isinstance(text, str):
+            lines.append(text)
+        else:
+            lines += text
+
+
+class Token(_HasText):
+    __slots__ = ("type", "line_number")
+
     def __init__(
         self,
         type: TokenType = TokenType.NONE,
-        text: t.List[str] = None,
+        text: t.Union[str, t.List[str], None] = None,
         line_number: int = 0,
     ) -> None:
+        self._text = [] if text is None else text
         self.type = type
-        self.text = text or []
         self.line_number = line_number
 
 
@@ -111,6 +144,28 @@ class Mode(Enum):
     SECTION_HEADER = 7
 
 
+# What a line starts with. Each line is matched against _LINE_KIND_RE once
+# and its kind is the index of the group which matched.
+_SEE_FILE = 1
+_DOC_LINE = 2
+_UNDERLINE = 3  # group 4 is the underline character
+_BEGIN_MARKER = 5
+_END_MARKER = 6
+_COMMENT = 7
+_CODE = 0
+
+_LINE_KIND_RE = re.compile(
+    r"(// ~see-file )"
+    r"|(// --)"
+    r"|(// ([=~^'`])\4)"
+    r"|(// ~begin-doc)"
+    r"|(// ~end-doc)"
+    r"|(//)"
+)
+
+_LineCase = t.Callable[[str, int], t.Optional[Token]]
+
+
 class Tokenizer:
     def __init__(self) -> None:
         self._line_number = 0
@@ -118,26 +173,36 @@ class Tokenizer:
         self._indent_level = 0
         self._text: t.List[str] = []
         self._section_text_max_dedent = 0
+        self._cases: t.Dict[Mode, _LineCase] = {
+            Mode.OUTER_SPACE: self._case_outer_space,
+            Mode.SECTION_TEXT: self._case_section_text,
+            Mode.UNKNOWN_CODE: self._case_unknown_code,
+            Mode.CLASS_CODE: self._case_class_code,
+            Mode.NONCLASS_CODE: self._case_nonclass_code,
+        }
 
     def read(self, l: Line) -> t.Optional[Token]:
-        self._line_number += 1
-        if l.is_include_directive():
-            return Token(TokenType.SEE_FILE, [l.text()], self._line_number)
-        method_name = "_case_{}".format(self._m.name.lower())
-        method = t.cast(
-            t.Callable[[Line], t.Optional[Token]], getattr(self, method_name)
-        )
-        if method is None:
-            raise ValueError("Unhandled Mode! {}".format(method_name))
-
-        return method(l)
+        return self.read_line(l.text())
 
-    def _case_outer_space(self, l: Line) -> t.Optional[Token]:
-        if l.starts_with_doc_line():
+    def read_line(self, line: str) -> t.Optional[Token]:
+        """Reads the next line, which must not have trailing whitespace."""
+        self._line_number += 1
+        match = _LINE_KIND_RE.match(line)
+        kind = (match.lastindex or _CODE) if match else _CODE
+        if kind == _SEE_FILE:
+            return Token(TokenType.SEE_FILE, line, self._line_number)
+        case = self._cases.get(self._m)
+        if case is None:
+            raise ValueError("Unhandled Mode! {}".format(self._m))
+
+        return case(line, kind)
+
+    def _case_outer_space(self, line: str, kind: int) -> t.Optional[Token]:
+        if kind == _DOC_LINE:
             self._m = Mode.SECTION_TEXT
             self._text = []
-            return Token(TokenType.SECTION_START, None, self._line_number)
-        elif l.begin_marker():
+            return Token(TokenType.SECTION_START, [], self._line_number)
+        elif kind == _BEGIN_MARKER:
             self._m = Mode.UNKNOWN_CODE
             self._text = []
         return None
@@ -156,25 +221,20 @@ class Tokenizer:
     #             self._text.append(l.strip_comment_slashes().strip())
     #             return None
 
-    def _case_section_text(self, l: Line) -> t.Optional[Token]:
-        rst_section = l.starts_with_rst_section_underline()
-        if rst_section:
-            if l.doc_line_with_tail():
+    def _case_section_text(self, line: str, kind: int) -> t.Optional[Token]:
+        if kind == _DOC_LINE or kind == _UNDERLINE:
+            if line.endswith("-/"):
                 self._m = Mode.OUTER_SPACE
                 self._text = []
-            return Token(
-                TokenType.SECTION_DIVIDER, [rst_section], self._line_number
-            )
-        elif l.starts_with_section_comment():
-            return Token(
-                TokenType.SECTION_TEXT,
-                [l.strip_comment_slashes()],
-                self._line_number,
-            )
+            return Token(TokenType.SECTION_DIVIDER, line[3], self._line_number)
+        elif kind != _CODE:
+            # Strip the "// " or "//"
+            text = line[3:] if line[2:3] == " " else line[2:]
+            return Token(TokenType.SECTION_TEXT, text, self._line_number)
         else:
             self._m = Mode.UNKNOWN_CODE
             self._text = []
-            return self._case_unknown_code(l)
+            return self._case_unknown_code(line, kind)
 
         # elif l.starts_with_doc_line():  # finish section, add Token
         #     dedent_text = []
@@ -202,62 +262,77 @@ class Tokenizer:
         #     self._text.append(s_text)
         #     return None
 
-    def _case_unknown_code(self, l: Line) -> t.Optional[Token]:
-        if l.end_marker():
+    def _case_unknown_code(self, line: str, kind: int) -> t.Optional[Token]:
+        if kind == _END_MARKER:
             self._m = Mode.OUTER_SPACE
             return None
-        elif l.class_keyword():
+        elif "class" in line:
             self._m = Mode.CLASS_CODE
         else:
             self._m = Mode.NONCLASS_CODE
-        self._text.append("    {}".format(l.text()))
+        self._text.append("    " + line)
         return None
 
-    def _case_class_code(self, l: Line) -> t.Optional[Token]:
-        if l.end_class_marker():
-            self._text.append("    {}".format(l.text()))
+    def _case_class_code(self, line: str, kind: int) -> t.Optional[Token]:
+        # Special }; at start of line.
+        if line.lstrip().startswith("};"):
+            self._text.append("    " + line)
             self._m = Mode.OUTER_SPACE
             t = Token(TokenType.CODE, self._text, self._line_number)
             self._text = []
             return t
-        return self._case_nonclass_code(l)
+        return self._case_nonclass_code(line, kind)
 
-    def _case_nonclass_code(self, l: Line) -> t.Optional[Token]:
-        if l.end_marker():
+    def _case_nonclass_code(self, line: str, kind: int) -> t.Optional[Token]:
+        if kind == _END_MARKER:
             self._m = Mode.OUTER_SPACE
             t = Token(TokenType.CODE, self._text, self._line_number)
             self._text = []
             return t
-        elif l.starts_with_doc_line():
+        elif kind == _DOC_LINE:
             self._m = Mode.SECTION_TEXT
             t = Token(TokenType.CODE, self._text, self._line_number)
             self._text = []
             return t
         else:
-            if len(l.text()) > 0:
-                self._text.append("    {}".format(l.text()))
+            if line:
+                self._text.append("    " + line)
             else:
                 self._text.append("")
             return None
 
 
-def parse_source(lines: t.List[str], read_file: FileReader) -> t.List[Token]:
-    tokens: t.List[Token] = []
+def _include_tokens(
+    read_file: FileReader, kwargs: common.IncludeFileArgs
+) -> t.Iterable[Token]:
+    # Readers which can tokenize includes themselves may have done it before.
+    tokenize_include = getattr(read_file, "tokenize_include", None)
+    if tokenize_include is not None:
+        return t.cast(t.Iterable[Token], tokenize_include(**kwargs))
+    other_file_lines, other_file_reader = read_file(**kwargs)
+    return iter_tokens(other_file_lines, other_file_reader)
+
 
+def iter_tokens(
+    lines: t.Iterable[str], read_file: FileReader
+) -> t.Iterator[Token]:
+    """Tokenizes lines lazily, following any "// ~see-file" directives."""
     tokenizer = Tokenizer()
 
     for line in lines:
-        result = tokenizer.read(Line(line.rstrip()))
+        result = tokenizer.read_line(line.rstrip())
         if result:
             if result.type == TokenType.SEE_FILE:
                 kwargs = common.parse_include_file_args(result.text[0][12:])
-                other_file_lines, other_file_reader = read_file(**kwargs)
-                tokens += parse_source(other_file_lines, other_file_reader)
+                yield from _include_tokens(read_file, kwargs)
             else:
-                tokens.append(result)
+                yield result
 
-    tokens.append(Token(TokenType.EOF, []))
-    return tokens
+    yield Token(TokenType.EOF, [])
+
+
+def parse_source(lines: t.List[str], read_file: FileReader) -> t.List[Token]:
+    return list(iter_tokens(lines, read_file))
 
 
 class SuperTokenType(Enum):
@@ -266,25 +341,73 @@ class SuperTokenType(Enum):
     CODE = 4
 
 
-class SuperToken(object):
+class SuperToken(_HasText):
     """A collapsed token.
 
     Only has the headers, text, and code blocks.
     """
 
+    __slots__ = ("type", "header", "line_number")
+
     def __init__(
         self,
         type: SuperTokenType,
-        text: t.List[str],
+        text: t.Union[str, t.List[str]],
         header: t.Optional[int],
         line_number: int,
     ) -> None:
+        self._text = text
         self.type = type
-        self.text = text or []
         self.header = header
         self.line_number = line_number
 
 
+def dedent_lines(lines: t.List[str]) -> t.List[str]:
+    """Dedents and strips a block of lines without joining them up.
+
+    Gives the same result as
+    ``textwrap.dedent("\\n".join(lines)).strip().split("\\n")``: the
+    indentation common to every line that isn't blank is removed, lines
+    with nothing but spaces and tabs become empty, and blank lines and
+    whitespace at either end of the block are dropped.
+    """
+    if any("\n" in line for line in lines):
+        # Joining would split these up, so leave them to textwrap.
+        return textwrap.dedent("\n".join(lines)).strip().split("\n")
+
+    contents = [line.lstrip(" \t") for line in lines]
+    indents = {
+        line[: len(line) - len(content)]
+        for line, content in zip(lines, contents)
+        if content
+    }
+    # The prefix common to all the indents is the one common to the first
+    # and last of them in sorted order.
+    margin = ""
+    if indents:
+        margin = os.path.commonprefix([min(indents), max(indents)])
+    start = len(margin)
+    result = [
+        line[start:] if content else ""
+        for line, content in zip(lines, contents)
+    ]
+
+    first = 0
+    while first < len(result) and (
+        not result[first] or result[first].isspace()
+    ):
+        first += 1
+    if first == len(result):
+        return [""]
+    last = len(result) - 1
+    while not result[last] or result[last].isspace():
+        last -= 1
+    result = result[first : last + 1]
+    result[0] = result[0].lstrip()
+    result[-1] = result[-1].rstrip()
+    return result
+
+
 class TokenCombiner:
     def __init__(self, token_type: SuperTokenType) -> None:
         self._tokens: t.List[Token] = []
@@ -299,16 +422,14 @@ class TokenCombiner:
         all_text: t.List[str] = []
 
         for tok in self._tokens:
-            all_text += tok.text
+            tok.add_text_to(all_text)
 
         # if self._token_type == SuperTokenType.SECTION_TEXT:
         #     for i in range(len(all_text)):
         #         assert all_text[i].startswith('// ')
         #         all_text[i] = all_text[i][3]
 
-        # This is probably going to slow things down, so figure out something
-        # else soon.
-        dedent_text = textwrap.dedent("\n".join(all_text)).strip().split("\n")
+        dedent_text = dedent_lines(all_text)
 
         result = SuperToken(
             self._token_type,
@@ -320,21 +441,20 @@ class TokenCombiner:
         return result
 
 
-def create_super_tokens(tokens: t.List[Token]) -> t.List[SuperToken]:
-    result: t.List[SuperToken] = []
-
+def iter_super_tokens(tokens: t.Iterable[Token]) -> t.Iterator[SuperToken]:
+    """Combines tokens lazily, looking at most two tokens ahead."""
     section_text = TokenCombiner(SuperTokenType.SECTION_TEXT)
     code = TokenCombiner(SuperTokenType.CODE)
 
-    def finish_combiners() -> None:
-        st = section_text.create_super_token() or code.create_super_token()
-        if st:
-            result.append(st)
+    def finish_combiners() -> t.Optional[SuperToken]:
+        return section_text.create_super_token() or code.create_super_token()
 
-    for i in range(len(tokens)):
-        current_t = tokens[i]
-        next_1 = tokens[i + 1] if i + 1 < len(tokens) else None
-        next_2 = tokens[i + 2] if i + 2 < len(tokens) else None
+    token_iter = iter(tokens)
+    window: t.Deque[Token] = collections.deque(itertools.islice(token_iter, 3))
+    while window:
+        current_t = window[0]
+        next_1 = window[1] if len(window) > 1 else None
+        next_2 = window[2] if len(window) > 2 else None
 
         if current_t.type == TokenType.SECTION_TEXT:
             if (
@@ -345,28 +465,39 @@ def create_super_tokens(tokens: t.List[Token]) -> t.List[SuperToken]:
                 in [TokenType.SECTION_TEXT, TokenType.SECTION_DIVIDER]
             ):
                 # We can only ever see one of these. Finish the combiners first
-                finish_combiners()
+                st = finish_combiners()
+                if st:
+                    yield st
                 # then create a header token
                 header_char = next_1.text[0][0]
                 header_depth = HEADERS_STR.index(header_char)
-                result.append(
-                    SuperToken(
-                        SuperTokenType.SECTION_HEADER,
-                        current_t.text,
-                        header=header_depth,
-                        line_number=current_t.line_number,
-                    )
+                yield SuperToken(
+                    SuperTokenType.SECTION_HEADER,
+                    current_t._text,
+                    header=header_depth,
+                    line_number=current_t.line_number,
                 )
             else:
                 section_text.add(current_t)
                 if next_1 and next_1.type != TokenType.SECTION_TEXT:
-                    finish_combiners()
+                    st = finish_combiners()
+                    if st:
+                        yield st
         elif current_t.type == TokenType.CODE:
             code.add(current_t)
             if next_1 != TokenType.CODE:
-                finish_combiners()
+                st = finish_combiners()
+                if st:
+                    yield st
 
-    return result
+        window.popleft()
+        next_token = next(token_iter, None)
+        if next_token is not None:
+            window.append(next_token)
+
+
+def create_super_tokens(tokens: t.List[Token]) -> t.List[SuperToken]:
+    return list(iter_super_tokens(tokens))
 
 
 def read_source(lines: t.List[str], reader: FileReader) -> t.List[SuperToken]:
@@ -374,16 +505,15 @@ def read_source(lines: t.List[str], reader: FileReader) -> t.List[SuperToken]:
     return create_super_tokens(tokens)
 
 
-def translate_cpp_file(
-    lines: t.List[str], section: t.Optional[str], reader: FileReader
-) -> t.List[str]:
+def iter_rst(
+    tokens: t.Iterable[SuperToken], section: t.Optional[str]
+) -> t.Iterator[str]:
+    """Renders super tokens as rst, one output line at a time."""
     if not section:
         header_depth = 0
     else:
         header_depth = HEADERS.index(section) + 1
 
-    tokens = read_source(lines, reader)
-    output = []
     for token in tokens:
         if token.type == SuperTokenType.SECTION_HEADER:
             if len(token.text) != 1:
@@ -397,20 +527,36 @@ def translate_cpp_file(
             depth = token.header + header_depth
 
             header_char = HEADERS[depth % len(HEADERS)]
-            output.append(token.text[0].rstrip())
-            output.append(header_char * len(token.text[0].rstrip()))
+            yield token.text[0].rstrip()
+            yield header_char * len(token.text[0].rstrip())
         elif token.type == SuperTokenType.SECTION_TEXT:
-            output += token.text
-            output.append("")
+            yield from token.text
+            yield ""
         elif token.type == SuperTokenType.CODE:
-            output.append(".. code-block:: c++\n")
+            yield ".. code-block:: c++\n"
 
             for cl in token.text:
                 cl_lines = cl.split("\n")
                 for cl_line in cl_lines:
-                    output.append(f"    {cl_line}".rstrip())
-            output.append("")
+                    yield f"    {cl_line}".rstrip()
+            yield ""
         else:
             raise AssertionError("Unexpected case: {}".format(token.type))
 
-    return output
+
+def iter_translate_cpp_file(
+    lines: t.Iterable[str], section: t.Optional[str], reader: FileReader
+) -> t.Iterator[str]:
+    """Streaming version of translate_cpp_file.
+
+    The tokenizer, combiner and renderer are chained generators, so only a
+    few tokens are held at a time rather than the whole file.
+    """
+    tokens = iter_super_tokens(iter_tokens(lines, reader))
+    return iter_rst(tokens, section)
+
+
+def translate_cpp_file(
+    lines: t.List[str], section: t.Optional[str], reader: FileReader
+) -> t.List[str]:
+    return list(iter_translate_cpp_file(lines, section, reader))
@@ -0,0 +1,99 @@
+import json
+import os
+import typing as t
+
+
+FILE_NAME = ".mrst-deps.json"
+
+
+def _norm(path: str) -> str:
+    return os.path.normpath(os.path.abspath(path))
+
+
+class Includes:
+    """The files a single document pulled in while it was generated.
+
+    Each edge is an (includer, included) pair, so for a header pulled in by
+    a ``~dumpfile`` which in turn has a ``// ~see-file`` both hops appear.
+    """
+
+    def __init__(self, document: str) -> None:
+        self.document = _norm(document)
+        self.edges: t.List[t.Tuple[str, str]] = []
+
+    def add(self, includer: str, included: str) -> None:
+        self.edges.append((_norm(includer), _norm(included)))
+
+    def files(self) -> t.List[str]:
+        """The document followed by everything it included, in order."""
+        result = [self.document]
+        for _, included in self.edges:
+            if included not in result:
+                result.append(included)
+        return result
+
+
+class DependencyGraph:
+    """Maps each document to the include edges recorded when generating it.
+
+    Paths are stored as absolute paths.
+    """
+
+    def __init__(
+        self, documents: t.Optional[t.Dict[str, t.List[t.List[str]]]] = None
+    ) -> None:
+        self._documents: t.Dict[str, t.List[t.Tuple[str, str]]] = {}
+        self._reverse: t.Optional[t.Dict[str, t.Set[str]]] = None
+        for document, edges in (documents or {}).items():
+            self._documents[document] = [(a, b) for a, b in edges]
+
+    @staticmethod
+    def load(path: str) -> "DependencyGraph":
+        """Reads a saved graph, returning an empty one if there isn't one."""
+        try:
+            with open(path, "r") as r:
+                return DependencyGraph(json.load(r))
+        except (OSError, ValueError):
+            return DependencyGraph()
+
+    def save(self, path: str) -> None:
+        with open(path, "w") as w:
+            json.dump(self._documents, w, indent=1, sort_keys=True)
+
+    def set_document(self, includes: Includes) -> None:
+        self._documents[includes.document] = list(includes.edges)
+        self._reverse = None
+
+    def remove_document(self, document: str) -> None:
+        self._documents.pop(_norm(document), None)
+        self._reverse = None
+
+    def documents(self) -> t.List[str]:
+        return sorted(self._documents)
+
+    def dependencies(self, document: str) -> t.List[str]:
+        """Every file the document includes, directly or not."""
+        edges = self._documents.get(_norm(document), [])
+        return sorted({included for _, included in edges})
+
+    def includers(self, path: str) -> t.List[str]:
+        """Files which directly include the given path."""
+        path = _norm(path)
+        return sorted(
+            {
+                includer
+                for edges in self._documents.values()
+                for includer, included in edges
+                if included == path
+            }
+        )
+
+    def affected_by(self, path: str) -> t.List[str]:
+        """Documents which need regenerating if the given file changes."""
+        if self._reverse is None:
+            self._reverse = {}
+            for document, edges in self._documents.items():
+                self._reverse.setdefault(document, set()).add(document)
+                for _, included in edges:
+                    self._reverse.setdefault(included, set()).add(document)
+        return sorted(self._reverse.get(_norm(path), set()))
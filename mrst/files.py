@@ -0,0 +1,124 @@
+import bisect
+import collections
+import typing as t
+
+from . import vfs
+
+
+DEFAULT_MAX_SIZE = 64 * 1024 * 1024
+
+
+class MarkerIndex:
+    """Finds the lines of a file which start with a given prefix.
+
+    Lines sharing a prefix sit next to each other once sorted, so after
+    sorting the lines once each lookup is a binary search no matter how
+    many different markers are used. Results are remembered per prefix.
+    """
+
+    def __init__(self, lines: t.List[str]) -> None:
+        self._numbers = sorted(range(len(lines)), key=lines.__getitem__)
+        self._sorted_lines = [lines[i] for i in self._numbers]
+        self._found: t.Dict[str, t.List[int]] = {}
+
+    def find(self, prefix: str) -> t.List[int]:
+        """The indices of every line starting with prefix, in order."""
+        if prefix not in self._found:
+            lines = self._sorted_lines
+            begin = bisect.bisect_left(lines, prefix)
+            end = begin
+            while end < len(lines) and lines[end].startswith(prefix):
+                end += 1
+            self._found[prefix] = sorted(self._numbers[begin:end])
+        return self._found[prefix]
+
+    def first(self, prefix: str) -> t.Optional[int]:
+        found = self.find(prefix)
+        return found[0] if found else None
+
+    def last(self, prefix: str) -> t.Optional[int]:
+        found = self.find(prefix)
+        return found[-1] if found else None
+
+
+class _Entry:
+    def __init__(self, stamp: vfs.Stamp, lines: t.List[str]) -> None:
+        self.stamp = stamp
+        self.lines = lines
+        self.index: t.Optional[MarkerIndex] = None
+
+
+class FileCache:
+    """Keeps the lines of files read during a build in memory.
+
+    Files are read from ``fs``, the disk unless another is given. Entries
+    are keyed by path and checked against the file's stamp, so a file
+    which changed is read again. Once the files held add up to more than
+    ``max_size`` bytes the least recently used ones are dropped.
+
+    Callers get the cached list itself and must not modify it.
+    """
+
+    def __init__(
+        self,
+        max_size: int = DEFAULT_MAX_SIZE,
+        fs: t.Optional[vfs.FileSystem] = None,
+    ) -> None:
+        self.max_size = max_size
+        self.fs: vfs.FileSystem = fs or vfs.DISK
+        self.hits = 0
+        self.misses = 0
+        self._size = 0
+        self._entries: "collections.OrderedDict[str, _Entry]" = (
+            collections.OrderedDict()
+        )
+
+    def __getstate__(self) -> t.Dict[str, t.Any]:
+        # Worker processes start out with an empty cache of their own rather
+        # than a copy of everything read so far.
+        return {"max_size": self.max_size, "fs": self.fs}
+
+    def __setstate__(self, state: t.Dict[str, t.Any]) -> None:
+        FileCache.__init__(self, state["max_size"], state["fs"])
+
+    def read_lines(self, path: str) -> t.List[str]:
+        stamp = self.fs.stamp(path)
+        entry = self._entries.get(path)
+        if entry is not None and entry.stamp == stamp:
+            self.hits += 1
+            self._entries.move_to_end(path)
+            return entry.lines
+
+        self.misses += 1
+        lines = self.fs.read_lines(path)
+        if entry is not None:
+            self._size -= entry.stamp[1]
+            del self._entries[path]
+        if stamp[1] <= self.max_size:
+            self._entries[path] = _Entry(stamp, lines)
+            self._size += stamp[1]
+            while self._size > self.max_size:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.stamp[1]
+        return lines
+
+    def marker_index(
+        self, path: str, lines: t.List[str]
+    ) -> t.Optional[MarkerIndex]:
+        """Returns the marker index for lines just read from path.
+
+        The index is kept with the cached lines, so it's only built once.
+        If the lines aren't kept it wouldn't be used again, so None is
+        returned instead.
+        """
+        entry = self._entries.get(path)
+        if entry is None or entry.lines is not lines:
+            return None
+        if entry.index is None:
+            entry.index = MarkerIndex(entry.lines)
+        return entry.index
+
+    def stats(self) -> str:
+        total = self.hits + self.misses
+        rate = 100.0 * self.hits / total if total else 0.0
+        return f"{self.hits} hits, {self.misses} misses ({rate:.0f}% hit rate)"
@@ -1,38 +1,97 @@
+from concurrent import futures
 import datetime
-import glob
+import io
+import logging
 import os
 import re
 import shutil
-import subprocess
-import tempfile
+import traceback
 import typing as t
 
+from . import cache
 from . import common
 from . import cpp
+from . import deps
+from . import files
+from . import git
+from . import logs
+from . import manifest
+from . import pandoc
+from . import procs
+from . import trace
+from . import vfs
+from . import walk
 
 
 DUMPFILE_RE = re.compile(common.make_include_reg("~dumpfile"))
 
+logger = logging.getLogger(__name__)
+
+# Stands in when there's no build context to record spans with.
+_NO_TRACER = trace.Tracer()
+
+
+def convert_md_to_rst(
+    lines: t.List[str], converter: t.Optional[pandoc.Converter] = None
+) -> t.List[str]:
+    return (converter or pandoc.Converter()).convert(lines)
 
-def _call_pandoc(mark_down_abs_path: str, rst_abs_path: str) -> None:
-    cmd = (
-        f"pandoc {mark_down_abs_path} --from markdown "
-        f"--to rst -s -o {rst_abs_path} --wrap=none"
-    )
-    subprocess.check_call(cmd, shell=True)
 
+class Context:
+    """State shared by everything generated during one build.
 
-def convert_md_to_rst(lines: t.List[str]) -> t.List[str]:
-    with tempfile.TemporaryDirectory() as tmpdir:
-        md_file = os.path.join(tmpdir, "input.md")
-        rst_file = os.path.join(tmpdir, "output.rst")
-        with open(md_file, "w") as w:
-            for line in lines:
-                w.write(line)
+    It's handed to worker processes too, so it must stay picklable.
+    """
 
-        _call_pandoc(md_file, rst_file)
-        with open(rst_file) as r:
-            return [l.rstrip() for l in r.readlines()]
+    def __init__(
+        self,
+        md_converter: t.Optional[pandoc.Converter] = None,
+        tracer: t.Optional[trace.Tracer] = None,
+        engine: t.Optional[procs.Engine] = None,
+        fs: t.Optional[vfs.FileSystem] = None,
+    ) -> None:
+        self.tracer = tracer or trace.Tracer()
+        # Where sources are read from and generated files written to.
+        self.fs: vfs.FileSystem = fs or vfs.DISK
+        # Runs pandoc and git alongside everything else.
+        self.engine = engine or procs.shared_engine()
+        self.md_converter = md_converter or pandoc.Converter(
+            tracer=self.tracer, engine=self.engine
+        )
+        self.files = files.FileCache(fs=self.fs)
+        self.commits = git.CommitResolver(self.tracer, self.engine)
+        self.include_memo: IncludeMemo = {}
+        self.max_include_depth = DEFAULT_MAX_INCLUDE_DEPTH
+        # Whether rst files may be hard linked or cloned rather than copied.
+        self.link_files = False
+        # Pinned so every page of a build agrees on it.
+        self.build_time = str(datetime.datetime.now())
+        # What the last build using this context recorded, so the next one
+        # doesn't have to load it again.
+        self.manifest: t.Optional[manifest.Manifest] = None
+        self.graph: t.Optional[deps.DependencyGraph] = None
+
+    def __getstate__(self) -> t.Dict[str, t.Any]:
+        # Workers don't need the last build's records.
+        state = self.__dict__.copy()
+        state["manifest"] = state["graph"] = None
+        return state
+
+
+def _find_last(
+    lines: t.List[str], prefix: str, index: t.Optional[files.MarkerIndex]
+) -> t.Optional[int]:
+    """The last line starting with prefix.
+
+    Without an index to reuse, scanning back from the end is quicker than
+    building one.
+    """
+    if index is not None:
+        return index.last(prefix)
+    for i in range(len(lines) - 1, -1, -1):
+        if lines[i].startswith(prefix):
+            return i
+    return None
 
 
 def _read_file(
@@ -41,9 +100,18 @@ def _read_file(
     end: t.Optional[int],
     start_after: t.Optional[str] = None,
     end_before: t.Optional[str] = None,
+    file_cache: t.Optional[files.FileCache] = None,
+    fs: t.Optional[vfs.FileSystem] = None,
 ) -> t.List[str]:
-    with open(input_file, "r") as r:
-        lines = r.readlines()
+    if file_cache is not None:
+        lines = file_cache.read_lines(input_file)
+    else:
+        lines = (fs or vfs.DISK).read_lines(input_file)
+
+    # Where a marker appears more than once the last match is used.
+    index = None
+    if file_cache is not None and (start_after or end_before):
+        index = file_cache.marker_index(input_file, lines)
 
     if start_after:
         if start is not None:
@@ -51,9 +119,9 @@ def _read_file(
                 '"start_after" and "start" arguments are mutually exclusive'
             )
         else:
-            for i, line in enumerate(lines):
-                if line.startswith(start_after):
-                    start = i + 1
+            found = _find_last(lines, start_after, index)
+            if found is not None:
+                start = found + 1
 
     if end_before:
         if end is not None:
@@ -61,9 +129,9 @@ def _read_file(
                 '"end_before" and "end" arguments are mutually exclusive'
             )
         else:
-            for i, line in enumerate(lines):
-                if line.startswith(end_before):
-                    end = i
+            found = _find_last(lines, end_before, index)
+            if found is not None:
+                end = found
 
     if start and end:
         subset = lines[start:end]
@@ -72,14 +140,115 @@ def _read_file(
     elif end:
         subset = lines[:end]
     else:
-        subset = lines
+        subset = lines[:]
 
     return subset
 
 
+DEFAULT_MAX_INCLUDE_DEPTH = 32
+
+
+class IncludeError(RuntimeError):
+    """Raised for a ``// ~see-file`` cycle or includes nested too deeply."""
+
+
+# The part of a file an include asked for: its path, start and end.
+_Slice = t.Tuple[str, t.Optional[int], t.Optional[int]]
+
+
+class _TokenizedInclude:
+    """The tokens of an included slice along with what it included in turn.
+
+    ``depth`` is how many levels of includes it took, counting itself.
+    ``stamps`` has the stamp of every file the tokens came from, both the
+    slice's own and every file included beneath it.
+    """
+
+    def __init__(
+        self,
+        tokens: t.List[cpp.Token],
+        edges: t.List[t.Tuple[str, str]],
+        depth: int,
+        stamps: t.Dict[str, vfs.Stamp],
+    ) -> None:
+        self.tokens = tokens
+        self.edges = edges
+        self.depth = depth
+        self.stamps = stamps
+
+    def is_current(self, fs: vfs.FileSystem) -> bool:
+        """True unless any of the files the tokens came from changed."""
+        try:
+            return all(
+                fs.stamp(path) == stamp for path, stamp in self.stamps.items()
+            )
+        except FileNotFoundError:
+            return False
+
+
+IncludeMemo = t.Dict[_Slice, _TokenizedInclude]
+
+
 class FileReader:
-    def __init__(self, original: str) -> None:
+    """Reads the files a C++ file pulls in with ``// ~see-file``.
+
+    If given a memo, each slice of a file is only tokenized once no matter
+    how many files include it, until it or anything it includes changes.
+    ``parents`` are the slices which led to this file, used to spot
+    include cycles. Files are read from the file cache's filesystem if
+    there is one, otherwise from ``fs``.
+    """
+
+    def __init__(
+        self,
+        original: str,
+        includes: t.Optional[deps.Includes] = None,
+        file_cache: t.Optional[files.FileCache] = None,
+        memo: t.Optional[IncludeMemo] = None,
+        max_depth: int = DEFAULT_MAX_INCLUDE_DEPTH,
+        parents: t.Tuple[_Slice, ...] = (),
+        fs: t.Optional[vfs.FileSystem] = None,
+    ) -> None:
         self._current_source = original
+        self._includes = includes
+        self._file_cache = file_cache
+        if file_cache is not None:
+            fs = file_cache.fs
+        self._fs = fs or vfs.DISK
+        self._memo = memo
+        self._max_depth = max_depth
+        self._parents = parents
+        # The most levels of includes below this file.
+        self._deepest = 0
+        # The stamps of the files tokenized below this file.
+        self._stamps: t.Dict[str, vfs.Stamp] = {}
+
+    def _child(
+        self, input_file: str, includes: t.Optional[deps.Includes], key: _Slice
+    ) -> "FileReader":
+        return FileReader(
+            input_file,
+            includes,
+            self._file_cache,
+            self._memo,
+            self._max_depth,
+            self._parents + (key,),
+            self._fs,
+        )
+
+    def _check(self, key: _Slice, depth: int) -> None:
+        if key in self._parents:
+            chain = self._parents[self._parents.index(key) :] + (key,)
+            raise IncludeError(
+                "~see-file cycle: "
+                + " -> ".join(os.path.relpath(k[0]) for k in chain)
+            )
+        # The dumped file itself is the first parent.
+        if len(self._parents) - 1 + depth > self._max_depth:
+            raise IncludeError(
+                f"~see-file of {key[0]} nests includes more than "
+                f"{self._max_depth} deep"
+            )
 
     def __call__(
         self,
@@ -91,8 +260,66 @@ class FileReader:
         full_input_file = os.path.join(
             os.path.dirname(self._current_source), input_file
         )
-        lines = _read_file(full_input_file, start, end)
-        return lines, FileReader(full_input_file)
+        key = (os.path.abspath(full_input_file), start, end)
+        self._check(key, 1)
+        if self._includes is not None:
+            self._includes.add(self._current_source, full_input_file)
+        lines = _read_file(
+            full_input_file,
+            start,
+            end,
+            file_cache=self._file_cache,
+            fs=self._fs,
+        )
+        return lines, self._child(full_input_file, self._includes, key)
+
+    def tokenize_include(
+        self,
+        input_file: str,
+        start: t.Optional[int],
+        end: t.Optional[int],
+        **_kwargs: t.Any,
+    ) -> t.Iterable[cpp.Token]:
+        """Returns the tokens of an included file, reusing earlier ones."""
+        if self._memo is None:
+            lines, reader = self(input_file, start, end)
+            return cpp.iter_tokens(lines, reader)
+
+        full_input_file = os.path.join(
+            os.path.dirname(self._current_source), input_file
+        )
+        key = (os.path.abspath(full_input_file), start, end)
+        self._check(key, 1)
+        entry = self._memo.get(key)
+        if entry is not None and not entry.is_current(self._fs):
+            entry = None
+        if entry is None:
+            # Taken before reading, so a change made meanwhile isn't missed.
+            stamp = self._fs.stamp(full_input_file)
+            nested = deps.Includes(full_input_file)
+            lines = _read_file(
+                full_input_file,
+                start,
+                end,
+                file_cache=self._file_cache,
+                fs=self._fs,
+            )
+            child = self._child(full_input_file, nested, key)
+            tokens = list(cpp.iter_tokens(lines, child))
+            child._stamps[key[0]] = stamp
+            entry = _TokenizedInclude(
+                tokens, nested.edges, child._deepest + 1, child._stamps
+            )
+            self._memo[key] = entry
+        else:
+            self._check(key, entry.depth)
+
+        self._deepest = max(self._deepest, entry.depth)
+        self._stamps.update(entry.stamps)
+        if self._includes is not None:
+            self._includes.add(self._current_source, full_input_file)
+            self._includes.edges += entry.edges
+        return entry.tokens
 
 
 def _dump_file(
@@ -104,10 +331,28 @@ def _dump_file(
     start_after: t.Optional[str],
     end_before: t.Optional[str],
     write_stream: t.TextIO,
+    includes: t.Optional[deps.Includes] = None,
+    ctx: t.Optional[Context] = None,
 ) -> None:
-    print(f" ^---- dumpfile {input_file} {start} {end} {indent} {section}")
+    logger.debug(
+        " ^---- dumpfile %s %s %s %s %s",
+        input_file,
+        start,
+        end,
+        indent,
+        section,
+    )
+    if includes is not None:
+        includes.add(includes.document, input_file)
+    file_cache = ctx.files if ctx else None
     lines = _read_file(
-        input_file, start, end, start_after=start_after, end_before=end_before
+        input_file,
+        start,
+        end,
+        start_after=start_after,
+        end_before=end_before,
+        file_cache=file_cache,
+        fs=ctx.fs if ctx else None,
     )
 
     if indent:
@@ -115,20 +360,42 @@ def _dump_file(
     else:
         prefix = ""
 
+    final_lines: t.Iterable[str]
     if input_file.endswith(".md"):
-        final_lines = convert_md_to_rst(lines)
+        final_lines = convert_md_to_rst(
+            lines, ctx.md_converter if ctx else None
+        )
     elif input_file.endswith(".hpp") or input_file.endswith(".cpp"):
-        final_lines = cpp.translate_cpp_file(
-            lines, section, FileReader(input_file)
+        reader = FileReader(
+            input_file,
+            includes,
+            file_cache,
+            ctx.include_memo if ctx else None,
+            ctx.max_include_depth if ctx else DEFAULT_MAX_INCLUDE_DEPTH,
+            ((os.path.abspath(input_file), start, end),),
+            ctx.fs if ctx else None,
         )
+        final_lines = cpp.iter_translate_cpp_file(lines, section, reader)
     else:
-        final_lines = [prefix + l.rstrip() for l in lines]
+        final_lines = (prefix + l.rstrip() for l in lines)
+
+    _write_lines(write_stream, final_lines)
+
 
-    write_stream.write("\n".join(final_lines))
+def _write_lines(write_stream: t.TextIO, lines: t.Iterable[str]) -> None:
+    """Writes lines joined by newlines without building one big string."""
+    separator = ""
+    for line in lines:
+        write_stream.write(separator + line)
+        separator = "\n"
 
 
 def _dumpfile_directive(
-    current_source: str, matches: str, write_stream: t.TextIO
+    current_source: str,
+    matches: str,
+    write_stream: t.TextIO,
+    includes: t.Optional[deps.Includes] = None,
+    ctx: t.Optional[Context] = None,
 ) -> None:
     kwargs = common.parse_include_file_args(matches)
 
@@ -137,73 +404,465 @@ def _dumpfile_directive(
     )
 
     kwargs["input_file"] = full_input_file
-    _dump_file(write_stream=write_stream, **kwargs)
-
-
-def parse_m_rst(source: str, dst: str) -> None:
-    with open(dst, "w") as w:
-        with open(source, "r") as f:
-            for line in f.readlines():
-                if line.startswith("~dumpfile "):
-                    _dumpfile_directive(source, line[10:], w)
-                else:
-                    if "~~current-time~~" in line:
-                        line = line.replace(
-                            "~~current-time~~", str(datetime.datetime.now())
-                        )
-                    if "~~git-commit~~" in line:
-                        sha = subprocess.check_output(
-                            "git rev-parse HEAD",
-                            shell=True,
-                            cwd=os.path.dirname(source),
-                        )
-                        line = line.replace(
-                            "~~git-commit~~", sha.decode("utf-8")
-                        )
-                    w.write(f"{line}")
-
-
-def copy_rst_files(source: str, dst: str) -> None:
-    rel = os.path.relpath(dst, source)
-    print(rel)
-    for file in glob.iglob(f"{source}/**/*", recursive=True):
-        if os.path.isfile(file):
-            print(file)
-            rel_path = file[len(source) :]
-            print(rel_path)
-            if rel_path.startswith(os.sep):
-                rel_path = rel_path[1:]
-            print(rel_path)
-            to_path = os.path.join(dst, rel_path)
-            if file.endswith(".rst"):
-                print(f"{file} -> {to_path}")
-                shutil.copy(file, to_path)
-            elif file.endswith(".mrst"):
-                print(f"parse {file} -> {to_path}")
-                parse_m_rst(file, to_path)
+    tracer = ctx.tracer if ctx else _NO_TRACER
+    with tracer.span("dumpfile", "directive", file=full_input_file):
+        _dump_file(
+            write_stream=write_stream, includes=includes, ctx=ctx, **kwargs
+        )
+
+
+def expand_dumpfile(
+    directory: str, args: str, ctx: t.Optional[Context] = None
+) -> t.Tuple[str, deps.Includes]:
+    """Returns the rst ``~dumpfile <args>`` expands to in the directory.
+
+    Also returns every file that was read to produce it.
+    """
+    kwargs = common.parse_include_file_args(args)
+    kwargs["input_file"] = os.path.join(directory, kwargs["input_file"])
+    includes = deps.Includes(kwargs["input_file"])
+    w = io.StringIO()
+    _dump_file(write_stream=w, includes=includes, ctx=ctx, **kwargs)
+    return w.getvalue(), includes
+
+
+def _markdown_fragments(
+    source: str, lines: t.List[str], ctx: Context
+) -> t.Iterator[t.List[str]]:
+    """Yields the Markdown each ~dumpfile in an mrst file will convert."""
+    for line in lines:
+        if not line.startswith("~dumpfile "):
+            continue
+        try:
+            kwargs = common.parse_include_file_args(line[10:])
+            input_file = os.path.join(
+                os.path.dirname(source), kwargs["input_file"]
+            )
+            if not input_file.endswith(".md"):
+                continue
+            fragment = _read_file(
+                input_file,
+                kwargs["start"],
+                kwargs["end"],
+                start_after=kwargs["start_after"],
+                end_before=kwargs["end_before"],
+                file_cache=ctx.files,
+            )
+        except Exception:
+            # Reported when the file itself is generated.
+            continue
+        yield fragment
+
+
+def _prefetch(mrst_files: t.List[str], ctx: Context) -> None:
+    """Starts work shared by the given mrst files before generating them.
+
+    Their Markdown is converted, mostly in one pandoc run, and the commit
+    of each directory using ~~git-commit~~ is resolved once. The processes
+    this needs run in the background while files are generated, and each
+    file only waits for the results it uses. Anything still running when
+    the context is handed to workers is finished first, so they all share
+    the results.
+    """
+    fragments: t.List[t.List[str]] = []
+    directories: t.List[str] = []
+    for file in mrst_files:
+        lines = ctx.files.read_lines(file)
+        fragments += _markdown_fragments(file, lines, ctx)
+        if any("~~git-commit~~" in line for line in lines):
+            directories.append(os.path.dirname(file))
+    ctx.md_converter.start_all(fragments)
+    ctx.commits.start_all(directories)
+
+
+def render_m_rst(
+    source: str, ctx: t.Optional[Context] = None
+) -> t.Tuple[str, deps.Includes]:
+    """Returns the rst for an mrst file along with every file it included.
+
+    Everything is read through the context's filesystem, so with a
+    MemoryFileSystem nothing touches the disk.
+    """
+    ctx = ctx or Context()
+    includes = deps.Includes(source)
+    lines = ctx.files.read_lines(source)
+    w = io.StringIO()
+    for line in lines:
+        if line.startswith("~dumpfile "):
+            _dumpfile_directive(source, line[10:], w, includes, ctx)
+        else:
+            if "~~current-time~~" in line:
+                line = line.replace("~~current-time~~", ctx.build_time)
+            if "~~git-commit~~" in line:
+                sha = ctx.commits.commit(os.path.dirname(source))
+                line = line.replace("~~git-commit~~", sha)
+            w.write(f"{line}")
+    return w.getvalue(), includes
+
+
+def parse_m_rst(
+    source: str, dst: str, ctx: t.Optional[Context] = None
+) -> deps.Includes:
+    """Writes the rst for an mrst file, returning every file it included."""
+    ctx = ctx or Context()
+    # Everything is rendered before dst is touched, so a failure or Ctrl-C
+    # part way through can't leave a partial file for Sphinx to find.
+    rst, includes = render_m_rst(source, ctx)
+    if not ctx.fs.write_text(dst, rst):
+        logger.debug("%s is unchanged", dst)
+    return includes
+
+
+class GenerateError(RuntimeError):
+    """Raised once generation finishes if any files failed to generate."""
+
+    def __init__(self, failures: t.List[t.Tuple[str, str]]) -> None:
+        self.failures = failures
+        super().__init__(
+            "\n".join(f"{file}: {error}" for file, error in failures)
+        )
+
+
+def _generate_file(file: str, to_path: str, ctx: Context) -> deps.Includes:
+    ctx.fs.makedirs(os.path.dirname(to_path))
+    if file.endswith(".rst"):
+        logger.info("%s -> %s", file, to_path)
+        with ctx.tracer.span("copy", "file", file=file):
+            if not ctx.fs.copy_file(file, to_path, ctx.link_files):
+                logger.debug("%s is already in sync", to_path)
+        return deps.Includes(file)
+    else:
+        logger.info("parse %s -> %s", file, to_path)
+        with ctx.tracer.span("parse_m_rst", "file", file=file):
+            return parse_m_rst(file, to_path, ctx)
+
+
+# The context of the build a worker process is helping with.
+_worker_ctx: t.Optional[Context] = None
+
+
+def _init_worker(ctx: Context, log_settings: t.Optional[logs.Settings]) -> None:
+    global _worker_ctx
+    _worker_ctx = ctx
+    if log_settings is not None:
+        verbosity, json_format = log_settings
+        logs.configure(verbosity, json_format)
+
+
+def _generate_file_in_worker(
+    file: str, to_path: str
+) -> t.Tuple[deps.Includes, int, int, t.List[trace.Span]]:
+    """Also returns the file cache hits and misses and spans this caused."""
+    ctx = _worker_ctx
+    assert ctx is not None
+    file_cache = ctx.files
+    hits, misses = file_cache.hits, file_cache.misses
+    spans = ctx.tracer.spans
+    span_count = len(spans)
+    includes = _generate_file(file, to_path, ctx)
+    return (
+        includes,
+        file_cache.hits - hits,
+        file_cache.misses - misses,
+        spans[span_count:],
+    )
+
+
+def _describe_error(e: BaseException) -> str:
+    return traceback.format_exception_only(type(e), e)[-1].strip()
+
+
+def _generate_files(
+    work: t.List[t.Tuple[str, str]], jobs: int, ctx: Context
+) -> t.Iterator[t.Tuple[str, t.Optional[deps.Includes], t.Optional[str]]]:
+    """Generates each (file, to_path) pair, yielding results in order.
+
+    Each result is the file along with either its includes or an error.
+    """
+    # Workers would write to their own copy of any other filesystem.
+    if jobs <= 1 or len(work) <= 1 or ctx.fs is not vfs.DISK:
+        for file, to_path in work:
+            try:
+                yield file, _generate_file(file, to_path, ctx), None
+            except Exception as e:
+                yield file, None, _describe_error(e)
+        return
+
+    # Workers can't wait for processes started here, so those finish first.
+    ctx.md_converter.wait()
+    ctx.commits.wait()
+    with futures.ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=_init_worker,
+        initargs=(ctx, logs.settings()),
+    ) as pool:
+        pending = [
+            pool.submit(_generate_file_in_worker, file, to_path)
+            for file, to_path in work
+        ]
+        for (file, _), future in zip(work, pending):
+            try:
+                includes, hits, misses, spans = future.result()
+            except Exception as e:
+                yield file, None, _describe_error(e)
+                continue
+            ctx.files.hits += hits
+            ctx.files.misses += misses
+            ctx.tracer.spans += spans
+            yield file, includes, None
+
+
+def copy_rst_files(
+    source: str,
+    dst: str,
+    mf: t.Optional[manifest.Manifest] = None,
+    graph: t.Optional[deps.DependencyGraph] = None,
+    jobs: int = 1,
+    ctx: t.Optional[Context] = None,
+    prune: bool = False,
+    exclude: t.Optional[t.List[str]] = None,
+) -> None:
+    """Copies rst files and generates mrst files from source into dst.
+
+    If a manifest is given, outputs whose recorded inputs are unchanged are
+    left alone, and the inputs of everything written are recorded in it.
+    The includes of everything written are also recorded in the graph.
+    If prune is set, any other files already in dst apart from conf.py are
+    removed.
+
+    Paths matching the exclude patterns are skipped. By default these are
+    the ones in .mrstignore.
+
+    Files are read and written through the context's filesystem. With more
+    than one job the files are generated by a pool of processes, as long
+    as that's the disk. Either way every file is attempted, and if any of
+    them failed a GenerateError listing them is raised at the end.
+    """
+    seen: t.Set[str] = set()
+    work: t.List[t.Tuple[str, str]] = []
+    rel_paths: t.Dict[str, str] = {}
+    ctx = ctx or Context()
+    if exclude is None:
+        exclude = walk.exclude_patterns(source, ctx.fs)
+    for rel_path in walk.walk_files(source, walk.DOC_PATTERNS, exclude, ctx.fs):
+        logger.debug("found %s", rel_path)
+        file = os.path.join(source, rel_path)
+        to_path = os.path.join(dst, rel_path)
+        seen.add(rel_path)
+        if (
+            mf is not None
+            and mf.is_current(rel_path)
+            and ctx.fs.exists(to_path)
+        ):
+            logger.debug("%s is up to date", file)
+            continue
+        work.append((file, to_path))
+        rel_paths[file] = rel_path
+
+    with ctx.tracer.span("prefetch", "phase"):
+        _prefetch([file for file, _ in work if file.endswith(".mrst")], ctx)
+
+    failures: t.List[t.Tuple[str, str]] = []
+    for file, includes, error in _generate_files(work, jobs, ctx):
+        rel_path = rel_paths[file]
+        if error is not None:
+            failures.append((file, error))
+            # Forget the file so the next incremental run retries it.
+            if mf is not None:
+                mf.remove(rel_path)
+            continue
+        assert includes is not None
+        if mf is not None:
+            mf.record(rel_path, includes.files())
+        if graph is not None:
+            graph.set_document(includes)
+
+    if mf is not None:
+        for rel_path in mf.outputs():
+            if rel_path not in seen:
+                logger.info("removing stale %s", rel_path)
+                mf.remove(rel_path)
+                if graph is not None:
+                    graph.remove_document(os.path.join(source, rel_path))
+                try:
+                    ctx.fs.remove(os.path.join(dst, rel_path))
+                except FileNotFoundError:
+                    pass
+
+    if prune:
+        _remove_other_files(dst, seen | {"conf.py"}, ctx.fs)
+
+    if failures:
+        raise GenerateError(failures)
+
+
+def _remove_other_files(
+    directory: str, keep: t.Set[str], fs: vfs.FileSystem, rel_dir: str = ""
+) -> None:
+    """Removes every file in directory whose relative path isn't in keep."""
+    for name, is_dir in fs.listdir(os.path.join(directory, rel_dir)):
+        rel_path = os.path.join(rel_dir, name)
+        if is_dir:
+            _remove_other_files(directory, keep, fs, rel_path)
+        elif rel_path not in keep:
+            logger.info("removing stale %s", rel_path)
+            fs.remove(os.path.join(directory, rel_path))
 
 
 class Config:
-    def __init__(self, source: str, output: str) -> None:
+    def __init__(
+        self,
+        source: str,
+        output: str,
+        incremental: bool = False,
+        jobs: int = 1,
+        cache_dir: t.Optional[str] = None,
+        cache_size: int = cache.DEFAULT_MAX_SIZE,
+        file_cache_size: int = files.DEFAULT_MAX_SIZE,
+        tracer: t.Optional[trace.Tracer] = None,
+        sphinx_in_process: bool = False,
+        sphinx_jobs: t.Optional[str] = None,
+        sphinx_overrides: t.Optional[t.Dict[str, str]] = None,
+        sync: bool = False,
+        max_include_depth: int = DEFAULT_MAX_INCLUDE_DEPTH,
+        subprocess_limit: int = procs.DEFAULT_LIMIT,
+        skip_excluded: bool = False,
+    ) -> None:
         self.source_dir = source
         self.output_dir = output
         self.gen_source_dir = os.path.join(output, "gen")
         self.build_dir = os.path.join(output, "build")
+        self.manifest_file = os.path.join(output, manifest.FILE_NAME)
+        self.deps_file = os.path.join(output, deps.FILE_NAME)
+        self.incremental = incremental
+        self.jobs = jobs
+        self.cache_dir = cache_dir or os.path.join(output, ".mrst-cache")
+        # A size of zero turns caching off.
+        self.cache_size = cache_size
+        # How much of the files read during a build to keep in memory.
+        self.file_cache_size = file_cache_size
+        # Records where the time goes if tracing is enabled.
+        self.tracer = tracer or trace.Tracer()
+        # Run Sphinx through its API rather than starting sphinx-build.
+        self.sphinx_in_process = sphinx_in_process
+        # Sphinx's -j: a number of processes or "auto".
+        self.sphinx_jobs = sphinx_jobs
+        # Sphinx's -D: conf.py settings to override.
+        self.sphinx_overrides = sphinx_overrides or {}
+        # Rather than wiping the generated directory when starting over,
+        # bring it in sync, leaving unchanged files (and their mtimes)
+        # alone and linking rst files where possible.
+        self.sync = sync
+        # How deeply // ~see-file directives may nest.
+        self.max_include_depth = max_include_depth
+        # How many processes such as pandoc may run at once.
+        self.subprocess_limit = subprocess_limit
+        # Also skip what conf.py's exclude_patterns lists, not just what's
+        # in .mrstignore.
+        self.skip_excluded = skip_excluded
+
+
+def make_context(config: Config) -> Context:
+    """Makes the context for a build using the given config."""
+    md_cache = None
+    if config.cache_size > 0:
+        md_cache = cache.DiskCache(
+            os.path.join(config.cache_dir, "pandoc"), config.cache_size
+        )
+    engine = procs.Engine(config.subprocess_limit)
+    ctx = Context(
+        pandoc.Converter(md_cache, config.tracer, engine), config.tracer, engine
+    )
+    ctx.files = files.FileCache(config.file_cache_size, ctx.fs)
+    ctx.link_files = config.sync
+    ctx.max_include_depth = config.max_include_depth
+    return ctx
 
 
-def generate(config: Config) -> int:
-    try:
-        shutil.rmtree(config.gen_source_dir)
-    except FileNotFoundError:
-        pass
+def generate(config: Config, ctx: t.Optional[Context] = None) -> int:
+    """Generates the rst for the source dir.
+
+    A context left over from an earlier build of the same config may be
+    passed in to reuse what it has cached, including the manifest and
+    dependency graph of that build. Cached files and the tokens of
+    included C++ files are checked against the stamps of every file they
+    came from, so nothing stale is used.
+    """
+    with config.tracer.span("generate", "phase"):
+        return _generate(config, ctx)
+
+
+def _generate(config: Config, ctx: t.Optional[Context]) -> int:
+    conf_file = os.path.join(config.source_dir, "conf.py")
+    conf_digest = manifest.file_digest(conf_file)
+
+    own_ctx = ctx is None
+    if ctx is None:
+        ctx = make_context(config)
+    else:
+        # These can change between builds.
+        ctx.commits = git.CommitResolver(ctx.tracer, ctx.engine)
+        ctx.build_time = str(datetime.datetime.now())
+
+    mf: t.Optional[manifest.Manifest] = None
+    graph = deps.DependencyGraph()
+    if config.incremental:
+        previous = ctx.manifest
+        if previous is None:
+            previous = manifest.Manifest.load(config.manifest_file)
+        # A changed conf.py can change every page, so it starts over.
+        if previous.conf_digest == conf_digest and os.path.isdir(
+            config.gen_source_dir
+        ):
+            mf = previous
+            if ctx.graph is not None:
+                graph = ctx.graph
+            else:
+                graph = deps.DependencyGraph.load(config.deps_file)
+    prune = False
+    if mf is None:
+        if config.sync:
+            prune = True
+        else:
+            try:
+                shutil.rmtree(config.gen_source_dir)
+            except FileNotFoundError:
+                pass
+        mf = manifest.Manifest(conf_digest)
 
     os.makedirs(config.gen_source_dir, exist_ok=True)
     os.makedirs(config.build_dir, exist_ok=True)
 
-    shutil.copy(
-        os.path.join(config.source_dir, "conf.py"),
-        os.path.join(config.gen_source_dir, "conf.py"),
-    )
+    gen_conf_file = os.path.join(config.gen_source_dir, "conf.py")
+    if manifest.file_digest(gen_conf_file) != conf_digest:
+        shutil.copy(conf_file, gen_conf_file)
 
-    copy_rst_files(config.source_dir, config.gen_source_dir)
-    return 0
+    result = 0
+    try:
+        copy_rst_files(
+            config.source_dir,
+            config.gen_source_dir,
+            mf,
+            graph,
+            config.jobs,
+            ctx,
+            prune,
+            walk.exclude_patterns(
+                config.source_dir, ctx.fs, config.skip_excluded
+            ),
+        )
+    except GenerateError as ge:
+        for file, error in ge.failures:
+            logger.error("error generating %s: %s", file, error)
+        result = 1
+    # Conversions nothing ended up using are still worth caching.
+    ctx.md_converter.wait()
+    if own_ctx:
+        ctx.engine.close()
+    if ctx.md_converter.disk_cache is not None:
+        ctx.md_converter.disk_cache.prune()
+    logger.info("file cache: %s", ctx.files.stats())
+    mf.save(config.manifest_file)
+    graph.save(config.deps_file)
+    ctx.manifest, ctx.graph = mf, graph
+    return result
@@ -0,0 +1,156 @@
+from concurrent import futures
+import os
+import re
+import typing as t
+
+from . import procs
+from . import trace
+
+
+_SHA_RE = re.compile(r"^[0-9a-f]{40}([0-9a-f]{24})?$")
+
+
+def _read(path: str) -> t.Optional[str]:
+    try:
+        with open(path, "r") as r:
+            return r.read().strip()
+    except OSError:
+        return None
+
+
+def find_git_dir(directory: str) -> t.Optional[str]:
+    """Finds the git directory of the repository containing a directory."""
+    current = os.path.abspath(directory)
+    while True:
+        dot_git = os.path.join(current, ".git")
+        if os.path.isdir(dot_git):
+            return dot_git
+        if os.path.isfile(dot_git):
+            # Worktrees and submodules point elsewhere with "gitdir: <path>"
+            content = _read(dot_git) or ""
+            if content.startswith("gitdir:"):
+                return os.path.normpath(
+                    os.path.join(current, content[7:].strip())
+                )
+            return None
+        parent = os.path.dirname(current)
+        if parent == current:
+            return None
+        current = parent
+
+
+def head_commit(git_dir: str) -> t.Optional[str]:
+    """Reads the commit HEAD points to straight from the git directory.
+
+    Returns None if it can't be worked out this way.
+    """
+    head = _read(os.path.join(git_dir, "HEAD"))
+    if head is None:
+        return None
+    if not head.startswith("ref:"):
+        return head if _SHA_RE.match(head) else None
+
+    ref = head[4:].strip()
+    common_dir = git_dir
+    relative_common_dir = _read(os.path.join(git_dir, "commondir"))
+    if relative_common_dir:
+        common_dir = os.path.normpath(
+            os.path.join(git_dir, relative_common_dir)
+        )
+    for d in (git_dir, common_dir):
+        sha = _read(os.path.join(d, ref))
+        if sha and _SHA_RE.match(sha):
+            return sha
+
+    packed_refs = _read(os.path.join(common_dir, "packed-refs")) or ""
+    for line in packed_refs.split("\n"):
+        if line.startswith("#") or line.startswith("^"):
+            continue
+        sha, _, name = line.partition(" ")
+        if name == ref and _SHA_RE.match(sha):
+            return sha
+    return None
+
+
+class CommitResolver:
+    """Works out the commit checked out for a directory.
+
+    Each repository is only looked at once. Normally that means reading
+    a few files in its git directory; ``git rev-parse`` is only run, by
+    the given engine, if that doesn't work out.
+    """
+
+    def __init__(
+        self,
+        tracer: t.Optional[trace.Tracer] = None,
+        engine: t.Optional[procs.Engine] = None,
+    ) -> None:
+        self.tracer = tracer or trace.Tracer()
+        self.engine = engine or procs.shared_engine()
+        self._git_dirs: t.Dict[str, t.Optional[str]] = {}
+        self._commits: t.Dict[str, str] = {}
+        self._pending: t.Dict[str, "futures.Future[str]"] = {}
+
+    def __getstate__(self) -> t.Dict[str, t.Any]:
+        # Anything still running is looked up again if it's needed.
+        state = self.__dict__.copy()
+        state["_pending"] = {}
+        return state
+
+    def _start(self, directory: str) -> str:
+        """Starts working out the commit of a directory.
+
+        Returns the key it's stored under once it's known.
+        """
+        directory = os.path.abspath(directory)
+        if directory not in self._git_dirs:
+            self._git_dirs[directory] = find_git_dir(directory)
+        git_dir = self._git_dirs[directory]
+
+        key = git_dir or directory
+        if key not in self._commits and key not in self._pending:
+            sha = head_commit(git_dir) if git_dir else None
+            if sha is not None:
+                self._commits[key] = sha
+            else:
+                span = self.tracer.span(
+                    "git rev-parse", "subprocess", directory=directory
+                )
+                self._pending[key] = self.engine.submit(
+                    procs.run,
+                    ["git", "rev-parse", "HEAD"],
+                    None,
+                    directory,
+                    span=span,
+                )
+        return key
+
+    def start_all(self, directories: t.Iterable[str]) -> None:
+        """Starts working out the commits of directories in the background.
+
+        Any ``git rev-parse`` needed runs alongside whatever else is going
+        on, and is only waited for when ``commit`` asks for the result.
+        """
+        for directory in directories:
+            self._start(directory)
+
+    def wait(self) -> None:
+        """Waits for everything started in the background to finish.
+
+        Commits which couldn't be worked out are tried again if they're
+        asked for.
+        """
+        pending, self._pending = self._pending, {}
+        for key, future in pending.items():
+            try:
+                self._commits[key] = future.result().strip()
+            except Exception:
+                pass
+
+    def commit(self, directory: str) -> str:
+        key = self._start(directory)
+        if key not in self._commits:
+            future = self._pending.pop(key)
+            # Errors are raised here, for whoever wanted the commit.
+            self._commits[key] = future.result().strip()
+        return self._commits[key]
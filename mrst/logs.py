@@ -0,0 +1,77 @@
+import json
+import logging
+import sys
+import typing as t
+
+
+# Everything mrst logs goes through children of this logger.
+LOGGER_NAME = "mrst"
+
+# The arguments configure was last called with, so worker processes can be
+# set up the same way.
+Settings = t.Tuple[int, bool]
+_settings: t.Optional[Settings] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats each record as a single line of JSON."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: t.Dict[str, t.Any] = {
+            "time": record.created,
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+class _StderrHandler(logging.Handler):
+    """Writes to whatever sys.stderr is when a record is logged."""
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            sys.stderr.write(self.format(record) + "\n")
+        except Exception:
+            self.handleError(record)
+
+
+def level_for(verbosity: int) -> int:
+    """Maps the count of -v flags minus the count of -q flags to a level."""
+    if verbosity < 0:
+        return logging.ERROR
+    elif verbosity == 0:
+        return logging.WARNING
+    elif verbosity == 1:
+        return logging.INFO
+    else:
+        return logging.DEBUG
+
+
+def configure(verbosity: int = 0, json_format: bool = False) -> None:
+    """Sends mrst's log messages to stderr.
+
+    Only warnings and errors are shown by default. Messages below the
+    level are dropped before they're formatted, so they cost very little.
+    """
+    global _settings
+    _settings = (verbosity, json_format)
+    logger = logging.getLogger(LOGGER_NAME)
+    for handler in list(logger.handlers):
+        if isinstance(handler, _StderrHandler):
+            logger.removeHandler(handler)
+    handler = _StderrHandler()
+    if json_format:
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(level_for(verbosity))
+    logger.propagate = False
+
+
+def settings() -> t.Optional[Settings]:
+    """Returns how logging was configured, if it has been."""
+    return _settings
@@ -0,0 +1,99 @@
+import hashlib
+import json
+import os
+import typing as t
+
+from . import version
+from . import vfs
+
+
+FILE_NAME = ".mrst-manifest.json"
+
+
+def file_digest(path: str) -> t.Optional[str]:
+    """Returns a hash of the file's contents, or None if it can't be read."""
+    h = hashlib.sha1()
+    try:
+        with open(path, "rb") as r:
+            for chunk in iter(lambda: r.read(65536), b""):
+                h.update(chunk)
+    except OSError:
+        return None
+    return h.hexdigest()
+
+
+class Manifest:
+    """Records the inputs each generated file was built from.
+
+    Keys are paths relative to the generated source directory, values map
+    every input file read while producing that output to its digest.
+    """
+
+    def __init__(
+        self,
+        conf_digest: t.Optional[str],
+        entries: t.Optional[t.Dict[str, t.Dict[str, t.Optional[str]]]] = None,
+    ) -> None:
+        self.conf_digest = conf_digest
+        self.entries = entries or {}
+        # The digest of each input along with the stamp it was taken at.
+        self._digests: t.Dict[str, t.Tuple[vfs.Stamp, t.Optional[str]]] = {}
+
+    @staticmethod
+    def load(path: str) -> "Manifest":
+        """Reads a manifest, returning an empty one if it's missing or stale."""
+        try:
+            with open(path, "r") as r:
+                data = json.load(r)
+        except (OSError, ValueError):
+            return Manifest(None)
+        if data.get("version") != version.VERSION:
+            return Manifest(None)
+        return Manifest(data.get("conf"), data.get("entries"))
+
+    def save(self, path: str) -> None:
+        data = {
+            "version": version.VERSION,
+            "conf": self.conf_digest,
+            "entries": self.entries,
+        }
+        with open(path, "w") as w:
+            json.dump(data, w, indent=1, sort_keys=True)
+
+    def digest(self, path: str) -> t.Optional[str]:
+        """Digest of an input file.
+
+        A file is only read again once its stamp changes, so a manifest
+        kept between builds doesn't hash every input each time.
+        """
+        try:
+            stamp = vfs.DISK.stamp(path)
+        except OSError:
+            return None
+        known = self._digests.get(path)
+        if known is None or known[0] != stamp:
+            known = (stamp, file_digest(path))
+            self._digests[path] = known
+        return known[1]
+
+    def is_current(self, output: str) -> bool:
+        """True if none of the inputs recorded for the output have changed."""
+        inputs = self.entries.get(output)
+        if not inputs:
+            return False
+        for input_file, digest in inputs.items():
+            if digest is None or self.digest(input_file) != digest:
+                return False
+        return True
+
+    def record(self, output: str, inputs: t.Iterable[str]) -> None:
+        self.entries[output] = {
+            os.path.normpath(i): self.digest(os.path.normpath(i))
+            for i in inputs
+        }
+
+    def outputs(self) -> t.List[str]:
+        return sorted(self.entries)
+
+    def remove(self, output: str) -> None:
+        self.entries.pop(output, None)
@@ -0,0 +1,245 @@
+import collections
+from concurrent import futures
+import functools
+import json
+import subprocess
+import typing as t
+
+from . import cache
+from . import procs
+from . import trace
+
+
+PANDOC_ARGS = ["--from", "markdown", "--to", "rst", "-s", "--wrap=none"]
+
+# How many conversions a Converter keeps in memory by default.
+DEFAULT_MAX_RESULTS = 4096
+
+# Run by ``pandoc lua``, this converts fragments separated by NUL
+# characters on stdin, writing their rst separated the same way. Each
+# fragment is read and written as a document of its own, so none of them
+# can affect how another converts, and the rst template makes the output
+# match that of PANDOC_ARGS.
+_CONVERT_EACH = """
+local options = {
+  template = pandoc.template.compile(pandoc.template.default("rst")),
+  wrap_text = "wrap-none",
+}
+local outputs = {}
+for markdown in (io.read("a") .. "\\0"):gmatch("(.-)\\0") do
+  local rst = pandoc.write(pandoc.read(markdown, "markdown"), "rst", options)
+  if rst:sub(-1) ~= "\\n" then
+    rst = rst .. "\\n"
+  end
+  outputs[#outputs + 1] = rst
+end
+io.write(table.concat(outputs, "\\0"))
+"""
+
+
+def _run_pandoc(markdown: str) -> str:
+    return procs.run(["pandoc"] + PANDOC_ARGS, input=markdown)
+
+
+def _run_pandoc_alone(markdown: str) -> t.List[str]:
+    return [_run_pandoc(markdown)]
+
+
+def _run_pandoc_each(fragments: t.List[str]) -> t.List[str]:
+    """Converts each fragment on its own, with a single pandoc process."""
+    output = procs.run(
+        ["pandoc", "lua", "-e", _CONVERT_EACH], input="\0".join(fragments)
+    )
+    return output.split("\0")
+
+
+@functools.lru_cache(maxsize=1)
+def version() -> str:
+    try:
+        output = subprocess.check_output(["pandoc", "--version"])
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+    return output.decode("utf-8").split("\n")[0].strip()
+
+
+def _output_lines(text: str) -> t.List[str]:
+    lines = text.split("\n")
+    if lines and lines[-1] == "":
+        lines.pop()
+    return [l.rstrip() for l in lines]
+
+
+def _can_batch(markdown: str) -> bool:
+    # pandoc expands tabs and drops carriage returns in what it's given
+    # before reading it, which pandoc.read doesn't do.
+    return not any(c in markdown for c in "\0\t\r")
+
+
+class _Run:
+    """A pandoc run converting one or more fragments in the background."""
+
+    def __init__(
+        self,
+        future: "futures.Future[t.List[str]]",
+        keys: t.List[str],
+        fragments: t.List[str],
+    ) -> None:
+        self.future = future
+        self.keys = keys
+        self.fragments = fragments
+
+
+class Converter:
+    """Converts Markdown to rst using pandoc.
+
+    The ``max_results`` most recently used results are kept in memory and,
+    if a disk cache is given, every result is stored there keyed by the
+    Markdown, the pandoc version and the arguments. ``start_all`` converts
+    many fragments in the background with a single pandoc process. pandoc
+    is run by the given engine.
+    """
+
+    def __init__(
+        self,
+        disk_cache: t.Optional[cache.DiskCache] = None,
+        tracer: t.Optional[trace.Tracer] = None,
+        engine: t.Optional[procs.Engine] = None,
+        max_results: int = DEFAULT_MAX_RESULTS,
+    ) -> None:
+        self.disk_cache = disk_cache
+        self.tracer = tracer or trace.Tracer()
+        self.engine = engine or procs.shared_engine()
+        self.max_results = max_results
+        self._results: "collections.OrderedDict[str, t.List[str]]" = (
+            collections.OrderedDict()
+        )
+        # The runs still converting each fragment, by key.
+        self._pending: t.Dict[str, _Run] = {}
+        # Turned off if pandoc can't convert a batch, which it can't if
+        # it's too old to run Lua scripts.
+        self._batching = True
+
+    def __getstate__(self) -> t.Dict[str, t.Any]:
+        # Worker processes get everything converted so far.
+        self.wait()
+        state = self.__dict__.copy()
+        del state["_pending"]
+        return state
+
+    def __setstate__(self, state: t.Dict[str, t.Any]) -> None:
+        self.__dict__.update(state)
+        self._pending = {}
+
+    def _key(self, markdown: str) -> str:
+        return cache.DiskCache.make_key(
+            version(), " ".join(PANDOC_ARGS), markdown
+        )
+
+    def _lookup(self, key: str) -> t.Optional[t.List[str]]:
+        while key in self._pending:
+            self._finish(self._pending[key])
+        if key in self._results:
+            self._results.move_to_end(key)
+            return self._results[key]
+        if self.disk_cache is not None:
+            cached = self.disk_cache.get(key)
+            if cached is not None:
+                lines = t.cast(t.List[str], json.loads(cached))
+                self._remember(key, lines)
+                return lines
+        return None
+
+    def _remember(self, key: str, lines: t.List[str]) -> None:
+        self._results[key] = lines
+        self._results.move_to_end(key)
+        while len(self._results) > self.max_results:
+            self._results.popitem(last=False)
+
+    def _store(self, key: str, lines: t.List[str]) -> None:
+        self._remember(key, lines)
+        if self.disk_cache is not None:
+            self.disk_cache.put(key, json.dumps(lines))
+
+    def _unknown(self, fragments: t.Iterable[t.List[str]]) -> t.Dict[str, str]:
+        """The fragments neither converted nor being converted, by key."""
+        result: t.Dict[str, str] = {}
+        for lines in fragments:
+            markdown = "".join(lines)
+            key = self._key(markdown)
+            if (
+                key not in result
+                and key not in self._pending
+                and self._lookup(key) is None
+            ):
+                result[key] = markdown
+        return result
+
+    def _start(self, key: str, markdown: str) -> None:
+        span = self.tracer.span("pandoc", "subprocess", fragments=1)
+        future = self.engine.submit(_run_pandoc_alone, markdown, span=span)
+        self._pending[key] = _Run(future, [key], [markdown])
+
+    def _start_batch(self, batch: t.Dict[str, str]) -> None:
+        keys, fragments = list(batch), list(batch.values())
+        span = self.tracer.span("pandoc", "subprocess", fragments=len(keys))
+        future = self.engine.submit(_run_pandoc_each, fragments, span=span)
+        run = _Run(future, keys, fragments)
+        for key in keys:
+            self._pending[key] = run
+
+    def _finish(self, run: _Run) -> None:
+        """Waits for a run and stores what it converted.
+
+        If a single fragment's run failed, nothing is stored and
+        ``convert`` has another go at it, raising the error if it fails
+        again. If a batch failed, batching is turned off and each of its
+        fragments is started on its own instead.
+        """
+        for key in run.keys:
+            self._pending.pop(key, None)
+        try:
+            outputs = run.future.result()
+        except (OSError, subprocess.CalledProcessError):
+            outputs = []
+        if len(outputs) == len(run.keys):
+            for key, output in zip(run.keys, outputs):
+                self._store(key, _output_lines(output))
+        elif len(run.keys) > 1:
+            self._batching = False
+            for key, markdown in zip(run.keys, run.fragments):
+                self._start(key, markdown)
+
+    def wait(self) -> None:
+        """Waits for everything started in the background to finish."""
+        while self._pending:
+            self._finish(next(iter(self._pending.values())))
+
+    def convert(self, lines: t.List[str]) -> t.List[str]:
+        markdown = "".join(lines)
+        key = self._key(markdown)
+        result = self._lookup(key)
+        if result is None:
+            span = self.tracer.span("pandoc", "subprocess", fragments=1)
+            output = self.engine.call(_run_pandoc, markdown, span=span)
+            result = _output_lines(output)
+            self._store(key, result)
+        return result
+
+    def start_all(self, fragments: t.Iterable[t.List[str]]) -> None:
+        """Starts converting the fragments not already known, in the background.
+
+        They're all converted by one pandoc process, which reads and
+        writes each fragment as a document of its own, so they come out
+        just as they would one at a time. A fragment pandoc would read
+        differently that way gets a run of its own, as does everything if
+        batching has been turned off, with as many running at once as the
+        engine allows. ``convert`` only waits for the run a fragment is
+        part of.
+        """
+        unknown = self._unknown(fragments)
+        batch = {k: md for k, md in unknown.items() if _can_batch(md)}
+        if len(batch) > 1 and self._batching:
+            self._start_batch(batch)
+        for key, markdown in unknown.items():
+            if key not in self._pending:
+                self._start(key, markdown)
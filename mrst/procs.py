@@ -0,0 +1,118 @@
+from concurrent import futures
+import os
+import subprocess
+import threading
+import typing as t
+
+
+# How many external processes may run at once by default.
+DEFAULT_LIMIT = os.cpu_count() or 4
+
+T = t.TypeVar("T")
+
+
+def run(
+    args: t.List[str],
+    input: t.Optional[str] = None,
+    cwd: t.Optional[str] = None,
+) -> str:
+    """Runs a process, returning its output.
+
+    Like ``subprocess.check_output``, CalledProcessError is raised if it
+    fails.
+    """
+    result = subprocess.run(
+        args,
+        input=None if input is None else input.encode("utf-8"),
+        stdout=subprocess.PIPE,
+        cwd=cwd,
+        check=True,
+    )
+    return result.stdout.decode("utf-8")
+
+
+class Engine:
+    """Runs external processes concurrently on a pool of threads.
+
+    Each process is waited on by a thread of its own, so callers carry on
+    with other work and only wait for a result once they need it. The
+    threads are started the first time anything is submitted, and at most
+    ``limit`` processes run at once.
+    """
+
+    def __init__(self, limit: int = DEFAULT_LIMIT) -> None:
+        self.limit = max(1, limit)
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._pool: t.Optional[futures.ThreadPoolExecutor] = None
+
+    def __getstate__(self) -> t.Dict[str, t.Any]:
+        # Worker processes start their own threads if they need them.
+        return {"limit": self.limit}
+
+    def __setstate__(self, state: t.Dict[str, t.Any]) -> None:
+        Engine.__init__(self, state["limit"])
+
+    def _start(self) -> futures.ThreadPoolExecutor:
+        if self._pid != os.getpid():
+            # A forked process doesn't get the pool's threads.
+            Engine.__init__(self, self.limit)
+        with self._lock:
+            if self._pool is None:
+                self._pool = futures.ThreadPoolExecutor(
+                    max_workers=self.limit, thread_name_prefix="mrst-procs"
+                )
+            return self._pool
+
+    @staticmethod
+    def _call(
+        fn: t.Callable[..., T],
+        args: t.Tuple[t.Any, ...],
+        span: t.Optional[t.ContextManager[None]],
+    ) -> T:
+        if span is None:
+            return fn(*args)
+        with span:
+            return fn(*args)
+
+    def submit(
+        self,
+        fn: t.Callable[..., T],
+        *args: t.Any,
+        span: t.Optional[t.ContextManager[None]] = None,
+    ) -> "futures.Future[T]":
+        """Starts fn(*args) in the background, returning a future for it.
+
+        ``span`` is entered around the call once it's allowed to start.
+        """
+        return self._start().submit(self._call, fn, args, span)
+
+    def call(
+        self,
+        fn: t.Callable[..., T],
+        *args: t.Any,
+        span: t.Optional[t.ContextManager[None]] = None,
+    ) -> T:
+        """Runs fn(*args) in the background and waits for the result."""
+        return self.submit(fn, *args, span=span).result()
+
+    def close(self) -> None:
+        """Waits for the threads to finish.
+
+        They're started again if anything else is submitted.
+        """
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown()
+
+
+_shared: t.Optional[Engine] = None
+
+
+def shared_engine() -> Engine:
+    """The engine used by anything which isn't given one."""
+    global _shared
+    if _shared is None:
+        _shared = Engine()
+    return _shared
@@ -0,0 +1,217 @@
+import json
+import logging
+import os
+import socket
+import socketserver
+import stat
+import threading
+import typing as t
+
+from . import build
+from . import gen
+from . import logs
+from . import version
+from . import walk
+from . import watch
+
+
+logger = logging.getLogger(__name__)
+
+Request = t.Dict[str, t.Any]
+Response = t.Dict[str, t.Any]
+
+
+class _ErrorCollector(logging.Handler):
+    """Keeps the errors logged while a request is handled."""
+
+    def __init__(self) -> None:
+        super().__init__(logging.ERROR)
+        self.messages: t.List[str] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.messages.append(record.getMessage())
+
+
+def _forget_changed_includes(ctx: gen.Context) -> None:
+    """Drops remembered includes which are out of date.
+
+    They'd be tokenized again anyway, so this only stops them piling up.
+    """
+    for key, entry in list(ctx.include_memo.items()):
+        if not entry.is_current(ctx.fs):
+            del ctx.include_memo[key]
+
+
+class Server:
+    """Answers requests about one source tree, keeping caches warm.
+
+    The files read, the tokens of included C++ files, pandoc's output and
+    the last build's manifest and dependency graph are all kept between
+    requests, so after the first build each request only pays for what
+    actually changed. Requests are handled one at a
+    time.
+    """
+
+    def __init__(self, config: gen.Config, run_sphinx: bool = False) -> None:
+        # Only the docs affected by changes are regenerated.
+        config.incremental = True
+        self.config = config
+        self.run_sphinx = run_sphinx
+        self.ctx = gen.make_context(config)
+        # Set by whatever is serving requests so "shutdown" can stop it.
+        self.stop: t.Callable[[], None] = lambda: None
+        self._lock = threading.Lock()
+        self._ops: t.Dict[str, t.Callable[[Request], Response]] = {
+            "ping": self._ping,
+            "generate": self._generate,
+            "translate": self._translate,
+            "shutdown": self._shutdown,
+        }
+
+    def handle(self, request: Request) -> Response:
+        """Carries out a request, returning the response to send back.
+
+        Every response has an ``ok`` field, an ``errors`` list of anything
+        logged as an error along the way and, if the request failed
+        outright, an ``error`` saying why.
+        """
+        op = self._ops.get(request.get("op", ""))
+        if op is None:
+            return {
+                "ok": False,
+                "error": f"unknown op: {request.get('op')}",
+                "errors": [],
+            }
+        collector = _ErrorCollector()
+        mrst_logger = logging.getLogger(logs.LOGGER_NAME)
+        with self._lock:
+            mrst_logger.addHandler(collector)
+            try:
+                response = op(request)
+            except Exception as e:
+                response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+            finally:
+                mrst_logger.removeHandler(collector)
+        response["errors"] = collector.messages
+        return response
+
+    def _ping(self, request: Request) -> Response:
+        return {"ok": True, "version": version.VERSION}
+
+    def _outputs(self) -> watch.Snapshot:
+        gen_dir = self.config.gen_source_dir
+        if not os.path.isdir(gen_dir):
+            return {}
+        return watch.snapshot(
+            os.path.join(gen_dir, rel_path)
+            for rel_path in walk.walk_files(gen_dir)
+        )
+
+    def _generate(self, request: Request) -> Response:
+        """Brings the generated docs up to date.
+
+        Responds with the generated files which were written or removed.
+        """
+        before = self._outputs()
+        _forget_changed_includes(self.ctx)
+        result = gen.generate(self.config, self.ctx)
+        if result == 0 and self.run_sphinx:
+            result = build.sphinx_build(self.config)
+        return {
+            "ok": result == 0,
+            "changed": sorted(watch.changes(before, self._outputs())),
+        }
+
+    def _translate(self, request: Request) -> Response:
+        """Responds with the rst a ``~dumpfile`` would produce.
+
+        ``args`` are the directive's arguments. Paths in them are relative
+        to ``directory``, which is itself relative to the source dir and
+        defaults to it.
+        """
+        args = request.get("args")
+        if not isinstance(args, str):
+            raise ValueError('"args" must be a string')
+        directory = os.path.join(
+            self.config.source_dir, request.get("directory", "")
+        )
+        rst, includes = gen.expand_dumpfile(directory, args, self.ctx)
+        return {"ok": True, "rst": rst, "files": includes.files()}
+
+    def _shutdown(self, request: Request) -> Response:
+        self.stop()
+        return {"ok": True}
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """Reads one JSON request per line, answering each with a line."""
+
+    server: "_SocketServer"
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("expected an object")
+            except ValueError as e:
+                response = {
+                    "ok": False,
+                    "error": f"bad request: {e}",
+                    "errors": [],
+                }
+            else:
+                response = self.server.mrst.handle(request)
+            self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+
+class _SocketServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, address: str, mrst: Server) -> None:
+        self.mrst = mrst
+        super().__init__(address, _Handler)
+
+
+def _remove_socket(address: str) -> None:
+    """Removes a socket left behind by an earlier server, but nothing else."""
+    try:
+        if stat.S_ISSOCK(os.stat(address).st_mode):
+            os.remove(address)
+    except FileNotFoundError:
+        pass
+
+
+def serve(
+    config: gen.Config,
+    address: str,
+    run_sphinx: bool = False,
+    ready: t.Callable[[], None] = lambda: None,
+) -> None:
+    """Serves requests on a Unix socket until asked to shut down.
+
+    Each line sent is a JSON request such as ``{"op": "generate"}`` and is
+    answered with a line of JSON; see Server for what can be asked.
+    """
+    mrst = Server(config, run_sphinx)
+    _remove_socket(address)
+    with _SocketServer(address, mrst) as server:
+        # shutdown waits for serve_forever to return, so it can't be
+        # called from the thread handling the request.
+        mrst.stop = lambda: threading.Thread(target=server.shutdown).start()
+        logger.info("serving %s on %s", config.source_dir, address)
+        ready()
+        try:
+            server.serve_forever()
+        finally:
+            _remove_socket(address)
+
+
+def request(address: str, message: Request) -> Response:
+    """Sends a single request to a server and returns its response."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.connect(address)
+        s.sendall(json.dumps(message).encode("utf-8") + b"\n")
+        with s.makefile("rb") as r:
+            return t.cast(Response, json.loads(r.readline()))
@@ -0,0 +1,147 @@
+import collections
+import json
+import os
+import threading
+import time
+import typing as t
+
+
+# Categories of span shown in the summary's "slowest" tables.
+SUMMARY_CATEGORIES = ("file", "directive", "subprocess")
+
+
+class Span:
+    """Something which took time: a phase, a file, a directive or a process.
+
+    Times are in nanoseconds, from ``time.perf_counter``.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        category: str,
+        start: int,
+        duration: int,
+        args: t.Dict[str, t.Any],
+    ) -> None:
+        self.name = name
+        self.category = category
+        self.start = start
+        self.duration = duration
+        self.args = args
+        self.pid = os.getpid()
+        self.tid = threading.get_ident()
+
+    def to_event(self) -> t.Dict[str, t.Any]:
+        """Returns the span as a Chrome trace "complete" event."""
+        return {
+            "name": self.name,
+            "cat": self.category,
+            "ph": "X",
+            "ts": self.start / 1000.0,
+            "dur": self.duration / 1000.0,
+            "pid": self.pid,
+            "tid": self.tid,
+            "args": self.args,
+        }
+
+
+def _now() -> int:
+    # perf_counter_ns needs Python 3.7.
+    return int(time.perf_counter() * 1e9)
+
+
+class _NoSpan:
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *_exc: t.Any) -> None:
+        return None
+
+
+_NO_SPAN = _NoSpan()
+
+
+class _ActiveSpan:
+    def __init__(
+        self,
+        tracer: "Tracer",
+        name: str,
+        category: str,
+        args: t.Dict[str, t.Any],
+    ) -> None:
+        self._tracer = tracer
+        self._name = name
+        self._category = category
+        self._args = args
+        self._start = 0
+
+    def __enter__(self) -> None:
+        self._start = _now()
+
+    def __exit__(self, *_exc: t.Any) -> None:
+        duration = _now() - self._start
+        self._tracer.spans.append(
+            Span(self._name, self._category, self._start, duration, self._args)
+        )
+
+
+class Tracer:
+    """Records spans of time spent during a build.
+
+    Tracing is off unless ``enabled`` is set, in which case ``span`` hands
+    back a context manager which does nothing.
+    """
+
+    def __init__(self, enabled: bool = False) -> None:
+        self.enabled = enabled
+        self.spans: t.List[Span] = []
+
+    def __getstate__(self) -> t.Dict[str, t.Any]:
+        # Worker processes record their own spans and send them back.
+        return {"enabled": self.enabled}
+
+    def __setstate__(self, state: t.Dict[str, t.Any]) -> None:
+        Tracer.__init__(self, state["enabled"])
+
+    def span(
+        self, name: str, category: str, **args: t.Any
+    ) -> t.ContextManager[None]:
+        if not self.enabled:
+            return _NO_SPAN
+        return _ActiveSpan(self, name, category, args)
+
+    def write_chrome_trace(self, path: str) -> None:
+        """Writes the spans in the Chrome trace event format.
+
+        Open the file in chrome://tracing or https://ui.perfetto.dev.
+        """
+        events = [span.to_event() for span in self.spans]
+        with open(path, "w") as w:
+            json.dump({"traceEvents": events}, w)
+
+    def summary(self, limit: int = 10) -> t.List[str]:
+        """Describes the total time of each span and the slowest ones."""
+        totals: t.Dict[str, int] = collections.defaultdict(int)
+        counts: t.Dict[str, int] = collections.defaultdict(int)
+        for span in self.spans:
+            totals[span.name] += span.duration
+            counts[span.name] += 1
+
+        lines = ["total time by span:"]
+        for name, total in sorted(totals.items(), key=lambda i: -i[1]):
+            lines.append(f"  {total / 1e9:9.3f}s  {name} (x{counts[name]})")
+        for category in SUMMARY_CATEGORIES:
+            slowest = sorted(
+                (s for s in self.spans if s.category == category),
+                key=lambda s: -s.duration,
+            )[:limit]
+            if not slowest:
+                continue
+            lines.append(f"slowest {category} spans:")
+            for span in slowest:
+                detail = " ".join(f"{k}={v}" for k, v in span.args.items())
+                lines.append(
+                    f"  {span.duration / 1e9:9.3f}s  {span.name} {detail}"
+                )
+        return lines
@@ -0,0 +1,280 @@
+import filecmp
+import io
+import os
+import shutil
+import typing as t
+
+import typing_extensions as te
+
+
+# Identifies a version of a file: its modification time and size.
+Stamp = t.Tuple[int, int]
+
+# The ioctl asking Linux to share a file's blocks with another (linux/fs.h).
+_FICLONE = 0x40049409
+
+
+class FileSystem(te.Protocol):
+    """Where mrst reads sources from and writes generated files to.
+
+    Paths are ordinary OS paths. Missing files raise FileNotFoundError.
+    """
+
+    def stamp(self, path: str) -> Stamp:
+        """Returns something which changes whenever the file does."""
+        ...
+
+    def read_lines(self, path: str) -> t.List[str]:
+        """Returns the lines of a text file, as ``readlines`` would."""
+        ...
+
+    def read_text(self, path: str) -> str:
+        """Returns the whole of a text file."""
+        ...
+
+    def write_text(self, path: str, text: str) -> bool:
+        """Writes text to path unless it already holds exactly that.
+
+        Returns True if the file was written.
+        """
+        ...
+
+    def copy_file(self, src: str, dst: str, link: bool = False) -> bool:
+        """Makes dst a copy of src unless it already is one.
+
+        Returns True if dst was written.
+        """
+        ...
+
+    def exists(self, path: str) -> bool:
+        """True if there's a file or directory at path."""
+        ...
+
+    def listdir(self, path: str) -> t.List[t.Tuple[str, bool]]:
+        """The name of each entry in a directory and whether it's one too."""
+        ...
+
+    def makedirs(self, path: str) -> None:
+        """Makes a directory and its parents unless they already exist."""
+        ...
+
+    def remove(self, path: str) -> None:
+        """Removes a file."""
+        ...
+
+
+def _reflink(src: str, dst: str) -> bool:
+    """Makes dst a copy-on-write clone of src, if the filesystem can."""
+    try:
+        import fcntl
+    except ImportError:
+        return False
+    with open(src, "rb") as r, open(dst, "wb") as w:
+        try:
+            fcntl.ioctl(w.fileno(), _FICLONE, r.fileno())
+        except OSError:
+            return False
+    shutil.copystat(src, dst)
+    return True
+
+
+def _is_synced(src: str, dst: str) -> bool:
+    src_st = os.stat(src)
+    try:
+        dst_st = os.stat(dst)
+    except FileNotFoundError:
+        return False
+    if os.path.samestat(src_st, dst_st):
+        return True
+    if src_st.st_size != dst_st.st_size:
+        return False
+    return src_st.st_mtime_ns == dst_st.st_mtime_ns or filecmp.cmp(
+        src, dst, shallow=False
+    )
+
+
+def _replace(dst: str, write: t.Callable[[str], None]) -> None:
+    """Has write fill a temp file, then moves it over dst in one step.
+
+    Whatever happens, dst is either left as it was or fully replaced.
+    """
+    tmp = f"{dst}.{os.getpid()}.tmp"
+    try:
+        if os.path.lexists(tmp):
+            os.remove(tmp)
+        write(tmp)
+        os.replace(tmp, dst)
+    except BaseException:
+        if os.path.lexists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def sync_file(src: str, dst: str, link: bool = False) -> bool:
+    """Makes dst a copy of src unless it already is one.
+
+    A dst with the same size and mtime, or the same content, is left
+    alone so its mtime doesn't change. Otherwise src is copied along with
+    its mtime, or if ``link`` is set, hard linked or cloned when the
+    filesystem allows it, which takes next to no I/O. The new file is
+    moved into place in one step.
+
+    Returns True if dst was written.
+    """
+    if _is_synced(src, dst):
+        return False
+
+    def write(tmp: str) -> None:
+        if link:
+            try:
+                os.link(src, tmp)
+                return
+            except OSError:
+                if _reflink(src, tmp):
+                    return
+        shutil.copy2(src, tmp)
+
+    _replace(dst, write)
+    return True
+
+
+def write_if_changed(dst: str, text: str) -> bool:
+    """Writes text to dst unless dst already holds exactly that.
+
+    Leaving an unchanged file alone keeps its mtime, so Sphinx doesn't
+    think it needs reading again. The new file is moved into place in one
+    step, so an interrupted build never leaves a half written one behind.
+
+    Returns True if dst was written.
+    """
+    try:
+        # Text written in "w" mode has its newlines translated.
+        with open(dst, "r", newline="") as r:
+            if r.read() == text.replace("\n", os.linesep):
+                return False
+    except (FileNotFoundError, UnicodeDecodeError):
+        pass
+
+    def write(tmp: str) -> None:
+        with open(tmp, "w") as w:
+            w.write(text)
+
+    _replace(dst, write)
+    return True
+
+
+class OSFileSystem:
+    """The real filesystem."""
+
+    def stamp(self, path: str) -> Stamp:
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+
+    def read_lines(self, path: str) -> t.List[str]:
+        with open(path, "r") as r:
+            return r.readlines()
+
+    def read_text(self, path: str) -> str:
+        with open(path, "r") as r:
+            return r.read()
+
+    def write_text(self, path: str, text: str) -> bool:
+        return write_if_changed(path, text)
+
+    def copy_file(self, src: str, dst: str, link: bool = False) -> bool:
+        return sync_file(src, dst, link)
+
+    def exists(self, path: str) -> bool:
+        return os.path.exists(path)
+
+    def listdir(self, path: str) -> t.List[t.Tuple[str, bool]]:
+        with os.scandir(path) as it:
+            # Anything which is neither a file nor a directory is skipped.
+            return [
+                (entry.name, entry.is_dir())
+                for entry in it
+                if entry.is_dir() or entry.is_file()
+            ]
+
+    def makedirs(self, path: str) -> None:
+        os.makedirs(path, exist_ok=True)
+
+    def remove(self, path: str) -> None:
+        os.remove(path)
+
+
+# Used by anything which isn't given a filesystem.
+DISK = OSFileSystem()
+
+
+class MemoryFileSystem:
+    """Keeps files in a dict rather than on disk.
+
+    Paths are made absolute, relative to the working directory, so they
+    can be given either way. Directories exist once something is written
+    inside them or they're made. Each write gets a new stamp.
+    """
+
+    def __init__(self, files: t.Optional[t.Mapping[str, str]] = None) -> None:
+        self._files: t.Dict[str, t.Tuple[Stamp, str]] = {}
+        self._dirs: t.Set[str] = set()
+        self._writes = 0
+        for path, text in (files or {}).items():
+            self.write_text(path, text)
+
+    def _get(self, path: str) -> t.Tuple[Stamp, str]:
+        try:
+            return self._files[os.path.abspath(path)]
+        except KeyError:
+            raise FileNotFoundError(path) from None
+
+    def paths(self) -> t.List[str]:
+        """The absolute path of every file, sorted."""
+        return sorted(self._files)
+
+    def stamp(self, path: str) -> Stamp:
+        return self._get(path)[0]
+
+    def read_lines(self, path: str) -> t.List[str]:
+        # Split as a file opened for reading would be.
+        return io.StringIO(self._get(path)[1]).readlines()
+
+    def read_text(self, path: str) -> str:
+        return self._get(path)[1]
+
+    def write_text(self, path: str, text: str) -> bool:
+        path = os.path.abspath(path)
+        entry = self._files.get(path)
+        if entry is not None and entry[1] == text:
+            return False
+        self.makedirs(os.path.dirname(path))
+        self._writes += 1
+        self._files[path] = ((self._writes, len(text.encode("utf-8"))), text)
+        return True
+
+    def copy_file(self, src: str, dst: str, link: bool = False) -> bool:
+        return self.write_text(dst, self.read_text(src))
+
+    def exists(self, path: str) -> bool:
+        path = os.path.abspath(path)
+        return path in self._files or path in self._dirs
+
+    def listdir(self, path: str) -> t.List[t.Tuple[str, bool]]:
+        path = os.path.abspath(path)
+        if path not in self._dirs:
+            raise FileNotFoundError(path)
+        return [
+            (os.path.basename(p), p in self._dirs)
+            for p in sorted(self._dirs | set(self._files))
+            if p != path and os.path.dirname(p) == path
+        ]
+
+    def makedirs(self, path: str) -> None:
+        path = os.path.abspath(path)
+        while path not in self._dirs:
+            self._dirs.add(path)
+            path = os.path.dirname(path)
+
+    def remove(self, path: str) -> None:
+        self._get(path)
+        del self._files[os.path.abspath(path)]
@@ -0,0 +1,186 @@
+import ast
+import functools
+import os
+import re
+import typing as t
+
+from . import vfs
+
+
+# Holds extra patterns of paths to skip, one per line, in the source dir.
+IGNORE_FILE = ".mrstignore"
+
+# The files copy_rst_files is interested in.
+DOC_PATTERNS = ["**.rst", "**.mrst"]
+
+
+@functools.lru_cache(maxsize=None)
+def _compile(pattern: str) -> t.Pattern[str]:
+    """Turns a Sphinx style pattern into a regex.
+
+    As with Sphinx's ``exclude_patterns``, ``*`` and ``?`` don't match
+    "/" but ``**`` matches anything, and the pattern has to match the
+    whole path relative to the source directory.
+    """
+    result = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        i += 1
+        if c == "*":
+            if pattern[i : i + 1] == "*":
+                i += 1
+                result.append(".*")
+            else:
+                result.append("[^/]*")
+        elif c == "?":
+            result.append("[^/]")
+        elif c == "[":
+            end = pattern.find("]", i + 1)
+            if end == -1:
+                result.append(re.escape(c))
+            else:
+                chars = pattern[i:end]
+                i = end + 1
+                if chars.startswith("!"):
+                    chars = "^/" + chars[1:]
+                result.append(f"[{chars}]")
+        else:
+            result.append(re.escape(c))
+    return re.compile("".join(result) + r"\Z")
+
+
+def matches(rel_path: str, patterns: t.Iterable[str]) -> bool:
+    """True if a path relative to the source dir matches any pattern."""
+    rel_path = rel_path.replace(os.sep, "/")
+    return any(_compile(p).match(rel_path) for p in patterns)
+
+
+def conf_exclude_patterns(
+    conf_file: str, fs: t.Optional[vfs.FileSystem] = None
+) -> t.List[str]:
+    """Reads ``exclude_patterns`` from a Sphinx conf.py without running it.
+
+    Only a literal list assigned at the top level is understood.
+    """
+    try:
+        tree = ast.parse((fs or vfs.DISK).read_text(conf_file), conf_file)
+    except (OSError, SyntaxError, ValueError):
+        return []
+    patterns: t.List[str] = []
+    for node in tree.body:
+        if isinstance(node, ast.Assign):
+            targets = node.targets
+        elif isinstance(node, ast.AugAssign):
+            targets = [node.target]
+        else:
+            continue
+        if not any(
+            isinstance(target, ast.Name) and target.id == "exclude_patterns"
+            for target in targets
+        ):
+            continue
+        try:
+            value = ast.literal_eval(node.value)
+        except ValueError:
+            continue
+        if not isinstance(node, ast.AugAssign):
+            patterns = []
+        patterns += [str(p) for p in value]
+    return patterns
+
+
+def ignore_file_patterns(
+    path: str, fs: t.Optional[vfs.FileSystem] = None
+) -> t.List[str]:
+    """Reads patterns from an ignore file, skipping blanks and comments."""
+    try:
+        lines = (fs or vfs.DISK).read_lines(path)
+    except FileNotFoundError:
+        return []
+    patterns = []
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            patterns.append(line.rstrip("/"))
+    return patterns
+
+
+def exclude_patterns(
+    source: str, fs: t.Optional[vfs.FileSystem] = None, use_conf: bool = False
+) -> t.List[str]:
+    """The patterns of paths in the source dir mrst should skip.
+
+    These are the patterns in the ignore file and, if ``use_conf`` is set,
+    Sphinx's ``exclude_patterns`` from conf.py too. Those aren't used by
+    default since Sphinx skips them itself, while files it excludes from
+    being read as docs may still be pulled in with ``.. include::``.
+    """
+    patterns = ignore_file_patterns(os.path.join(source, IGNORE_FILE), fs)
+    if use_conf:
+        patterns = (
+            conf_exclude_patterns(os.path.join(source, "conf.py"), fs)
+            + patterns
+        )
+    return patterns
+
+
+def _walk(
+    directory: str,
+    rel_dir: str,
+    include: t.Optional[t.List[str]],
+    exclude: t.List[str],
+    found: t.List[str],
+    dirs: t.List[str],
+    fs: vfs.FileSystem,
+) -> None:
+    dirs.append(rel_dir.replace("/", os.sep))
+    for name, is_dir in fs.listdir(directory):
+        # Hidden files are skipped, as glob did.
+        if name.startswith("."):
+            continue
+        rel_path = f"{rel_dir}/{name}" if rel_dir else name
+        if exclude and matches(rel_path, exclude):
+            continue
+        if is_dir:
+            _walk(
+                os.path.join(directory, name),
+                rel_path,
+                include,
+                exclude,
+                found,
+                dirs,
+                fs,
+            )
+        elif include is None or matches(rel_path, include):
+            found.append(rel_path.replace("/", os.sep))
+
+
+def walk_files(
+    source: str,
+    include: t.Optional[t.List[str]] = None,
+    exclude: t.Optional[t.List[str]] = None,
+    fs: t.Optional[vfs.FileSystem] = None,
+) -> t.List[str]:
+    """Finds the files under source, as sorted paths relative to it.
+
+    Directories matching an exclude pattern aren't looked inside at all.
+    If include patterns are given, only files matching one are returned.
+    """
+    return walk_tree(source, include, exclude, fs)[0]
+
+
+def walk_tree(
+    source: str,
+    include: t.Optional[t.List[str]] = None,
+    exclude: t.Optional[t.List[str]] = None,
+    fs: t.Optional[vfs.FileSystem] = None,
+) -> t.Tuple[t.List[str], t.List[str]]:
+    """Like walk_files, but also returns the directories looked inside.
+
+    Both are sorted paths relative to source, which itself is "".
+    """
+    found: t.List[str] = []
+    dirs: t.List[str] = []
+    _walk(source, "", include, exclude or [], found, dirs, fs or vfs.DISK)
+    return sorted(found), sorted(dirs)
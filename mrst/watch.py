@@ -0,0 +1,153 @@
+import logging
+import os
+import time
+import typing as t
+
+from . import deps
+from . import gen
+from . import vfs
+from . import walk
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 0.5
+DEFAULT_DEBOUNCE = 0.3
+
+Snapshot = t.Dict[str, t.Optional[vfs.Stamp]]
+
+
+class WatchedFiles:
+    """Every file a rebuild could depend on.
+
+    That's everything in the source tree that isn't excluded, which catches
+    new docs, plus every file the last build pulled in through ~dumpfile or
+    ~see-file, wherever it lives.
+
+    Walking a big tree takes a while, so the list is kept between polls.
+    The tree is only walked again when a directory in it changes, which
+    is what happens when a file is added, removed or renamed, or when the
+    files holding the exclude patterns change. The dependency graph is
+    only read again when ``refresh`` is called after a build.
+    """
+
+    def __init__(self, config: gen.Config) -> None:
+        self.config = config
+        self._pattern_files = [
+            os.path.join(config.source_dir, "conf.py"),
+            os.path.join(config.source_dir, walk.IGNORE_FILE),
+        ]
+        self._tree: t.List[str] = []
+        # The directories and pattern files the tree was found from.
+        self._structure: Snapshot = {}
+        self._included: t.List[str] = []
+        self.refresh()
+
+    def _walk(self) -> None:
+        source = self.config.source_dir
+        pattern_stamps = snapshot(self._pattern_files)
+        exclude = walk.exclude_patterns(
+            source, use_conf=self.config.skip_excluded
+        )
+        files, dirs = walk.walk_tree(source, exclude=exclude)
+        self._tree = [
+            os.path.abspath(os.path.join(source, rel_path))
+            for rel_path in files
+        ]
+        self._structure = {
+            **snapshot(os.path.join(source, d) for d in dirs),
+            **pattern_stamps,
+        }
+
+    def refresh(self) -> None:
+        """Walks the tree and reads the dependency graph again."""
+        self._walk()
+        graph = deps.DependencyGraph.load(self.config.deps_file)
+        included: t.Set[str] = set()
+        for document in graph.documents():
+            included.add(document)
+            included.update(graph.dependencies(document))
+        self._included = sorted(included)
+
+    def files(self) -> t.List[str]:
+        if changes(self._structure, snapshot(self._structure)):
+            self._walk()
+        return sorted(set(self._tree).union(self._included))
+
+
+def watched_files(config: gen.Config) -> t.List[str]:
+    """Every file a rebuild could depend on, as WatchedFiles finds them."""
+    return WatchedFiles(config).files()
+
+
+def snapshot(paths: t.Iterable[str]) -> Snapshot:
+    result: Snapshot = {}
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            result[path] = None
+        else:
+            result[path] = (st.st_mtime_ns, st.st_size)
+    return result
+
+
+def changes(old: Snapshot, new: Snapshot) -> t.Set[str]:
+    """The paths which were added, removed or modified between snapshots."""
+    return {
+        path for path in set(old) | set(new) if old.get(path) != new.get(path)
+    }
+
+
+def watch(
+    config: gen.Config,
+    build: t.Callable[[gen.Config], int],
+    interval: float = DEFAULT_INTERVAL,
+    debounce: float = DEFAULT_DEBOUNCE,
+    should_stop: t.Callable[[], bool] = lambda: False,
+    sleep: t.Callable[[float], None] = time.sleep,
+) -> None:
+    """Builds, then builds again each time a watched file changes.
+
+    Files are polled every ``interval`` seconds. Once something changes,
+    the rebuild waits until nothing has changed for ``debounce`` seconds,
+    so a burst of saves only causes one build. Builds are incremental, so
+    only the docs affected by the changes are regenerated.
+    """
+    config.incremental = True
+    build(config)
+    watched = WatchedFiles(config)
+    known = snapshot(watched.files())
+    while not should_stop():
+        sleep(interval)
+        current = snapshot(watched.files())
+        changed = changes(known, current)
+        if not changed:
+            continue
+        while True:
+            sleep(debounce)
+            settled = snapshot(watched.files())
+            if settled == current:
+                break
+            changed |= changes(current, settled)
+            current = settled
+
+        graph = deps.DependencyGraph.load(config.deps_file)
+        affected = {doc for path in changed for doc in graph.affected_by(path)}
+        logger.info(
+            "%d file(s) changed, affecting %d doc(s); rebuilding",
+            len(changed),
+            len(affected),
+        )
+        for doc in sorted(affected):
+            logger.info("  %s", doc)
+        if build(config) != 0:
+            logger.error("build failed; waiting for more changes")
+
+        # Anything the build started depending on is watched from now on,
+        # and anything it stopped depending on isn't. Files already known
+        # keep the state seen before the build, so a change made while it
+        # ran still triggers another one.
+        watched.refresh()
+        after = snapshot(watched.files())
+        known = {path: current.get(path, s) for path, s in after.items()}
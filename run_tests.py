@@ -6,7 +6,10 @@ import sys
 this_file = pathlib.Path(__file__)
 tests_path = this_file.parent / "tests"
 mrst_path = this_file.parent / "mrst"
-all_py_files = f"'{mrst_path}' '{tests_path}' '{this_file}'"
+benchmarks_path = this_file.parent / "benchmarks"
+all_py_files = (
+    f"'{mrst_path}' '{tests_path}' '{benchmarks_path}' '{this_file}'"
+)
 
 
 def main() -> None:
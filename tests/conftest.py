@@ -0,0 +1,37 @@
+import logging
+import pathlib
+import typing as t
+
+import pytest
+
+from mrst import logs
+
+
+@pytest.fixture(autouse=True)
+def restore_logging() -> t.Iterator[None]:
+    """Undoes logs.configure, which tests call directly or through the CLI.
+
+    Otherwise the "mrst" logger stops propagating and caplog sees nothing
+    in any later test.
+    """
+    logger = logging.getLogger(logs.LOGGER_NAME)
+    handlers = list(logger.handlers)
+    level, propagate = logger.level, logger.propagate
+    settings = logs.settings()
+    yield
+    logger.handlers = handlers
+    logger.setLevel(level)
+    logger.propagate = propagate
+    logs._settings = settings
+
+
+def _write(path: pathlib.Path, text: str) -> str:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+    return str(path)
+
+
+@pytest.fixture
+def write() -> t.Callable[[pathlib.Path, str], str]:
+    """Writes a text file, making its directory first. Returns its path."""
+    return _write
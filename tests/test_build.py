@@ -0,0 +1,111 @@
+import sys
+import types
+import typing as t
+
+import pytest
+
+from mrst import build
+from mrst import gen
+
+
+def _config(**kwargs: t.Any) -> gen.Config:
+    return gen.Config("src", "out", **kwargs)
+
+
+def test_sphinx_command() -> None:
+    cfg = _config(sphinx_jobs="auto", sphinx_overrides={"language": "en"})
+    assert [
+        "sphinx-build",
+        "-M",
+        "html",
+        "out/gen",
+        "out/build",
+        "-j",
+        "auto",
+        "-D",
+        "language=en",
+    ] == build.sphinx_command(cfg)
+
+
+def test_sphinx_build_runs_sphinx_build(monkeypatch: t.Any) -> None:
+    calls = []
+
+    def fake_call(cmd: t.List[str]) -> int:
+        calls.append(cmd)
+        return 3
+
+    monkeypatch.setattr(build.subprocess, "call", fake_call)
+    assert 3 == build.sphinx_build(_config())
+    assert [["sphinx-build", "-M", "html", "out/gen", "out/build"]] == calls
+
+
+class FakeSphinxError(Exception):
+    category = "Sphinx error"
+
+
+class FakeSphinx:
+    created: t.List[t.Dict[str, t.Any]] = []
+    error: t.Optional[Exception] = None
+
+    def __init__(self, **kwargs: t.Any) -> None:
+        FakeSphinx.created.append(kwargs)
+        self.statuscode = 0
+
+    def build(self) -> None:
+        if FakeSphinx.error is not None:
+            raise FakeSphinx.error
+        self.statuscode = 1
+
+
+@pytest.fixture
+def fake_sphinx(monkeypatch: t.Any) -> t.Type[FakeSphinx]:
+    sphinx = types.ModuleType("sphinx")
+    application = types.ModuleType("sphinx.application")
+    application.Sphinx = FakeSphinx  # type: ignore
+    errors = types.ModuleType("sphinx.errors")
+    errors.SphinxError = FakeSphinxError  # type: ignore
+    monkeypatch.setitem(sys.modules, "sphinx", sphinx)
+    monkeypatch.setitem(sys.modules, "sphinx.application", application)
+    monkeypatch.setitem(sys.modules, "sphinx.errors", errors)
+    monkeypatch.setattr(FakeSphinx, "created", [])
+    monkeypatch.setattr(FakeSphinx, "error", None)
+    return FakeSphinx
+
+
+def test_sphinx_in_process(
+    fake_sphinx: t.Type[FakeSphinx], monkeypatch: t.Any
+) -> None:
+    monkeypatch.setattr(build.os, "cpu_count", lambda: 6)
+    cfg = _config(
+        sphinx_in_process=True,
+        sphinx_jobs="auto",
+        sphinx_overrides={"language": "en"},
+    )
+    assert 1 == build.sphinx_build(cfg)
+    assert [
+        {
+            "srcdir": "out/gen",
+            "confdir": "out/gen",
+            "outdir": "out/build/html",
+            "doctreedir": "out/build/doctrees",
+            "buildername": "html",
+            "confoverrides": {"language": "en"},
+            "parallel": 6,
+        }
+    ] == fake_sphinx.created
+
+
+def test_sphinx_in_process_errors(
+    fake_sphinx: t.Type[FakeSphinx], caplog: t.Any
+) -> None:
+    fake_sphinx.error = FakeSphinxError("conf.py is broken")
+    assert 2 == build.sphinx_build(_config(sphinx_in_process=True))
+    assert ["Sphinx error: conf.py is broken"] == [
+        r.getMessage() for r in caplog.records
+    ]
+
+
+def test_sphinx_in_process_falls_back(monkeypatch: t.Any) -> None:
+    monkeypatch.setitem(sys.modules, "sphinx.application", None)
+    monkeypatch.setattr(build.subprocess, "call", lambda cmd: 0)
+    assert 0 == build.sphinx_build(_config(sphinx_in_process=True))
@@ -0,0 +1,40 @@
+import os
+import pathlib
+
+from mrst import cache
+
+
+class TestDiskCache:
+    def test_get_and_put(self, tmp_path: pathlib.Path) -> None:
+        c = cache.DiskCache(str(tmp_path))
+        key = c.make_key("a", "b")
+        assert c.get(key) is None
+        c.put(key, "value")
+        assert "value" == c.get(key)
+        assert 1 == c.hits
+        assert 1 == c.misses
+
+    def test_keys_depend_on_every_part(self) -> None:
+        assert cache.DiskCache.make_key("ab", "c") != cache.DiskCache.make_key(
+            "a", "bc"
+        )
+
+    def test_prune_evicts_least_recently_used(
+        self, tmp_path: pathlib.Path
+    ) -> None:
+        c = cache.DiskCache(str(tmp_path), max_size=10)
+        keys = [c.make_key(str(i)) for i in range(3)]
+        for i, key in enumerate(keys):
+            c.put(key, "12345")
+            os.utime(c._path(key), (1000 + i, 1000 + i))
+        # Reading the oldest entry makes it the most recently used.
+        assert "12345" == c.get(keys[0])
+
+        assert 1 == c.prune()
+        assert c.get(keys[0]) is not None
+        assert c.get(keys[1]) is None
+        assert c.get(keys[2]) is not None
+
+    def test_prune_missing_directory(self, tmp_path: pathlib.Path) -> None:
+        c = cache.DiskCache(str(tmp_path / "nope"))
+        assert 0 == c.prune()
@@ -1,3 +1,5 @@
+import logging
+import pathlib
 import sys
 import typing as t
 
@@ -5,7 +7,10 @@ import pytest
 
 from mrst import cli
 from mrst import build
+from mrst import deps
 from mrst import gen
+from mrst import serve
+from mrst import watch
 
 
 class FakeExit(RuntimeError):
@@ -91,3 +96,169 @@ class TestCli:
         assert "out" == self._cfg_arg.output_dir
         assert "out/gen" == self._cfg_arg.gen_source_dir
         assert "out/build" == self._cfg_arg.build_dir
+
+    def test_incremental(self) -> None:
+        assert 0 == self._call_cli(
+            ["prog", "--source", "src", "--output", "out", "--incremental"]
+        )
+        assert self._cfg_arg is not None
+        assert self._cfg_arg.incremental
+
+    def test_affected_by(self, capsys: t.Any, tmp_path: pathlib.Path) -> None:
+        self._monkeypatch.chdir(tmp_path)
+        includes = deps.Includes("src/index.mrst")
+        includes.add("src/index.mrst", "src/foo.hpp")
+        graph = deps.DependencyGraph()
+        graph.set_document(includes)
+        (tmp_path / "out").mkdir()
+        graph.save(str(tmp_path / "out" / deps.FILE_NAME))
+
+        assert 0 == self._call_cli(
+            [
+                "prog",
+                "--source",
+                "src",
+                "--output",
+                "out",
+                "--affected-by",
+                "src/foo.hpp",
+            ]
+        )
+        captured = capsys.readouterr()
+        assert "src/index.mrst\n" == captured.out
+        assert self._called_method is None
+
+    def test_jobs(self) -> None:
+        assert 0 == self._call_cli(
+            ["prog", "--source", "src", "--output", "out", "-j", "4"]
+        )
+        assert self._cfg_arg is not None
+        assert 4 == self._cfg_arg.jobs
+
+    def test_max_subprocesses(self) -> None:
+        assert 0 == self._call_cli(
+            [
+                "prog",
+                "--source",
+                "src",
+                "--output",
+                "out",
+                "--max-subprocesses",
+                "3",
+            ]
+        )
+        assert self._cfg_arg is not None
+        assert 3 == self._cfg_arg.subprocess_limit
+
+    def test_skip_excluded(self) -> None:
+        assert 0 == self._call_cli(
+            ["prog", "--source", "src", "--output", "out"]
+        )
+        assert self._cfg_arg is not None
+        assert not self._cfg_arg.skip_excluded
+        assert 0 == self._call_cli(
+            ["prog", "--source", "src", "--output", "out", "--skip-excluded"]
+        )
+        assert self._cfg_arg.skip_excluded
+
+    def test_tracing_is_off_by_default(self) -> None:
+        assert 0 == self._call_cli(
+            ["prog", "--source", "src", "--output", "out"]
+        )
+        assert self._cfg_arg is not None
+        assert not self._cfg_arg.tracer.enabled
+
+    def test_trace_file(self, tmp_path: pathlib.Path) -> None:
+        trace_file = tmp_path / "trace.json"
+        assert 0 == self._call_cli(
+            [
+                "prog",
+                "--source",
+                "src",
+                "--output",
+                "out",
+                "--trace-file",
+                str(trace_file),
+            ]
+        )
+        assert self._cfg_arg is not None
+        assert self._cfg_arg.tracer.enabled
+        assert "traceEvents" in trace_file.read_text()
+
+    def test_profile(self, capsys: t.Any) -> None:
+        assert 0 == self._call_cli(
+            ["prog", "--source", "src", "--output", "out", "--profile"]
+        )
+        assert "total time by span:" in capsys.readouterr().err
+
+    def test_verbosity(self) -> None:
+        self._call_cli(["prog", "--source", "src", "--output", "out", "-vv"])
+        assert logging.DEBUG == logging.getLogger("mrst").level
+        self._call_cli(["prog", "--source", "src", "--output", "out", "-q"])
+        assert logging.ERROR == logging.getLogger("mrst").level
+        self._call_cli(["prog", "--source", "src", "--output", "out"])
+        assert logging.WARNING == logging.getLogger("mrst").level
+
+    def test_watch(self) -> None:
+        watched = []
+
+        def fake_watch(
+            cfg: gen.Config,
+            build_: t.Callable[[gen.Config], int],
+            interval: float,
+        ) -> None:
+            watched.append((build_, interval))
+            raise KeyboardInterrupt()
+
+        self._monkeypatch.setattr(watch, "watch", fake_watch)
+        assert 0 == self._call_cli(
+            [
+                "prog",
+                "--source",
+                "src",
+                "--output",
+                "out",
+                "--skip-sphinx",
+                "--watch",
+                "--watch-interval",
+                "2",
+            ]
+        )
+        assert [(gen.generate, 2.0)] == watched
+
+    def test_serve(self) -> None:
+        served = []
+
+        def fake_serve(cfg: gen.Config, address: str, run_sphinx: bool) -> None:
+            served.append((cfg.source_dir, address, run_sphinx))
+
+        self._monkeypatch.setattr(serve, "serve", fake_serve)
+        assert 0 == self._call_cli(
+            ["prog", "--source", "src", "--output", "out", "--serve", "s"]
+        )
+        assert [("src", "s", True)] == served
+
+    def test_sphinx_options(self) -> None:
+        assert 0 == self._call_cli(
+            [
+                "prog",
+                "--source",
+                "src",
+                "--output",
+                "out",
+                "--sphinx-in-process",
+                "--sphinx-jobs",
+                "auto",
+                "--sphinx-define",
+                "language=en",
+                "--sphinx-define",
+                "html_theme=alabaster",
+            ]
+        )
+        assert self._cfg_arg is not None
+        assert self._cfg_arg.sphinx_in_process
+        assert "auto" == self._cfg_arg.sphinx_jobs
+        assert {
+            "language": "en",
+            "html_theme": "alabaster",
+        } == self._cfg_arg.sphinx_overrides
@@ -72,3 +72,30 @@ class TestParseIncludeFileArgs:
             }
         )
         assert args == expected
+
+
+def test_split_args_backslashes() -> None:
+    # A backslash only escapes a quote; anywhere else it's kept as is.
+    assert ["a\\b", "c"] == common._split_args('"a\\b" c')
+    assert ["C:\\dir", "x"] == common._split_args('"C:\\dir" x')
+    assert ["unterminated \\"] == common._split_args('"unterminated \\')
+
+
+class TestParseIncludeArgs:
+    def test_results_are_cached_and_immutable(self) -> None:
+        args = common.parse_include_args('"file" 0 ~ 4')
+        assert args is common.parse_include_args('"file" 0 ~ 4')
+        assert args.input_file == "file"
+        assert args.indent == 4
+        with pytest.raises(AttributeError):
+            args.start = 2  # type: ignore
+
+    def test_dicts_are_not_shared(self) -> None:
+        args = common.parse_include_file_args('"file"')
+        args["start"] = 3
+        assert common.parse_include_file_args('"file"') == get_default_args()
+
+    def test_errors_are_raised_every_time(self) -> None:
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                common.parse_include_file_args('"file" bogus = 1')
@@ -1,3 +1,4 @@
+import random
 import textwrap
 import typing as t
 
@@ -245,3 +246,136 @@ def test_include_feature() -> None:
         """
         ).lstrip(),
     )
+
+
+def test_streaming_translation_is_lazy() -> None:
+    consumed = []
+
+    def lines() -> t.Iterator[str]:
+        for i in range(10000):
+            consumed.append(i)
+            yield "// --------------------------------------------------"
+            yield f"// Section {i}"
+            yield "// --------------------------------------------------"
+            yield f"//    Text {i}"
+            yield "// -------------------------------------------------/"
+
+    output = cpp_mod.iter_translate_cpp_file(lines(), None, fake_reader)
+    assert "Section 0" == next(output)
+    assert "---------" == next(output)
+    assert "Text 0" == next(output)
+    assert len(consumed) < 5
+
+
+def test_streaming_matches_list_translation() -> None:
+    cpp = textwrap.dedent(
+        """
+        // --------------------------------------------------
+        // Big Header
+        // ==================================================
+        //       Desc
+        // --------------------------------------------------
+
+        #include "blahblahblah"
+
+        // --------------------------------------------------
+        // class Thing
+        // --------------------------------------------------
+        //    Desc 2
+        // --------------------------------------------------
+        class Thing {
+        };
+
+        // ~end-doc
+    """
+    ).split("\n")
+    expected = cpp_mod.translate_cpp_file(cpp, section="~", reader=fake_reader)
+    assert expected == list(
+        cpp_mod.iter_translate_cpp_file(iter(cpp), "~", fake_reader)
+    )
+
+
+def test_tokenizer_classifies_lines() -> None:
+    lines = [
+        "// -----------",
+        "// Title",
+        "// ===========",
+        "//text",
+        "// -----------",
+        "class A {",
+        "",
+        "};",
+        "// ~begin-doc",
+        "int f();",
+        "// ~end-doc",
+        "// ~see-file other.hpp",
+    ]
+    tokenizer = cpp_mod.Tokenizer()
+    tokens = [tokenizer.read_line(line) for line in lines]
+    actual = [(tk.type, tk.text) for tk in tokens if tk is not None]
+    T = cpp_mod.TokenType
+    assert actual == [
+        (T.SECTION_START, []),
+        (T.SECTION_TEXT, ["Title"]),
+        (T.SECTION_DIVIDER, ["="]),
+        (T.SECTION_TEXT, ["text"]),
+        (T.SECTION_DIVIDER, ["-"]),
+        (T.CODE, ["    class A {", "", "    };"]),
+        (T.CODE, ["    int f();"]),
+        (T.SEE_FILE, ["// ~see-file other.hpp"]),
+    ]
+
+    # The Line based interface still works.
+    tokenizer = cpp_mod.Tokenizer()
+    assert [tokenizer.read(cpp_mod.Line(line)) is None for line in lines] == [
+        tk is None for tk in tokens
+    ]
+
+
+def test_tokens_are_slotted() -> None:
+    # Translating a big header makes one of these per line, so they
+    # shouldn't carry a __dict__ each.
+    for obj in [
+        cpp_mod.Line("int f();"),
+        cpp_mod.Token(cpp_mod.TokenType.CODE, ["    int f();"], 1),
+        cpp_mod.SuperToken(
+            cpp_mod.SuperTokenType.CODE, ["int f();"], None, 1
+        ),
+    ]:
+        assert not hasattr(obj, "__dict__")
+
+
+def test_single_lines_are_not_listed() -> None:
+    token = cpp_mod.Token(cpp_mod.TokenType.SECTION_TEXT, "Some text", 1)
+    assert "Some text" == token._text
+    assert ["Some text"] == token.text
+    lines = ["Before"]
+    token.add_text_to(lines)
+    cpp_mod.Token(cpp_mod.TokenType.CODE, ["a", "b"], 2).add_text_to(lines)
+    assert ["Before", "Some text", "a", "b"] == lines
+
+
+def test_dedent_lines_matches_textwrap() -> None:
+    def expected(lines: t.List[str]) -> t.List[str]:
+        return textwrap.dedent("\n".join(lines)).strip().split("\n")
+
+    cases = [
+        [],
+        [""],
+        ["   ", "\t"],
+        ["    a", "      b", "", "    c"],
+        ["  a", "\tb"],
+        ["", "  ", "    a  ", "  \t", "      b", "   "],
+        ["a\n  b", "  c"],
+    ]
+    rng = random.Random(20)
+    for _ in range(2000):
+        line_count = rng.randint(0, 6)
+        cases.append(
+            [
+                "".join(rng.choices("  \tx\x0c", k=rng.randint(0, 6)))
+                for _ in range(line_count)
+            ]
+        )
+    for lines in cases:
+        assert cpp_mod.dedent_lines(lines) == expected(lines), lines
@@ -0,0 +1,58 @@
+import os
+import pathlib
+
+from mrst import deps
+
+
+def _includes(document: str, *edges: str) -> deps.Includes:
+    result = deps.Includes(document)
+    for edge in edges:
+        includer, included = edge.split("->")
+        result.add(includer, included)
+    return result
+
+
+class TestDependencyGraph:
+    def test_affected_by_follows_nested_includes(self) -> None:
+        graph = deps.DependencyGraph()
+        graph.set_document(
+            _includes("a.mrst", "a.mrst->foo.hpp", "foo.hpp->ex.cpp")
+        )
+        graph.set_document(_includes("b.mrst", "b.mrst->ex.cpp"))
+        graph.set_document(_includes("c.mrst"))
+
+        assert [os.path.abspath("a.mrst")] == graph.affected_by("foo.hpp")
+        assert [
+            os.path.abspath("a.mrst"),
+            os.path.abspath("b.mrst"),
+        ] == graph.affected_by("ex.cpp")
+        assert [os.path.abspath("c.mrst")] == graph.affected_by("c.mrst")
+        assert [] == graph.affected_by("nothing.hpp")
+
+    def test_includers(self) -> None:
+        graph = deps.DependencyGraph()
+        graph.set_document(
+            _includes("a.mrst", "a.mrst->foo.hpp", "foo.hpp->ex.cpp")
+        )
+        assert [os.path.abspath("foo.hpp")] == graph.includers("ex.cpp")
+
+    def test_remove_document(self) -> None:
+        graph = deps.DependencyGraph()
+        graph.set_document(_includes("a.mrst", "a.mrst->foo.hpp"))
+        assert graph.affected_by("foo.hpp")
+        graph.remove_document("a.mrst")
+        assert [] == graph.affected_by("foo.hpp")
+
+    def test_save_and_load(self, tmp_path: pathlib.Path) -> None:
+        graph = deps.DependencyGraph()
+        graph.set_document(_includes("a.mrst", "a.mrst->foo.hpp"))
+        path = str(tmp_path / deps.FILE_NAME)
+        graph.save(path)
+
+        loaded = deps.DependencyGraph.load(path)
+        assert graph.documents() == loaded.documents()
+        assert graph.affected_by("foo.hpp") == loaded.affected_by("foo.hpp")
+
+    def test_load_missing(self, tmp_path: pathlib.Path) -> None:
+        graph = deps.DependencyGraph.load(str(tmp_path / "nope.json"))
+        assert [] == graph.documents()
@@ -0,0 +1,110 @@
+import pathlib
+import pickle
+import typing as t
+
+from mrst import files
+
+
+class TestFileCache:
+    def test_hits_and_misses(
+        self, write: t.Any, tmp_path: pathlib.Path
+    ) -> None:
+        path = write(tmp_path / "a.hpp", "one\ntwo\n")
+        cache = files.FileCache()
+        assert ["one\n", "two\n"] == cache.read_lines(path)
+        assert ["one\n", "two\n"] == cache.read_lines(path)
+        assert 1 == cache.hits
+        assert 1 == cache.misses
+        assert "1 hits, 1 misses (50% hit rate)" == cache.stats()
+
+    def test_changed_file_is_read_again(
+        self, write: t.Any, tmp_path: pathlib.Path
+    ) -> None:
+        path = write(tmp_path / "a.hpp", "one\n")
+        cache = files.FileCache()
+        cache.read_lines(path)
+        write(tmp_path / "a.hpp", "one\ntwo\n")
+        assert ["one\n", "two\n"] == cache.read_lines(path)
+        assert 2 == cache.misses
+
+    def test_least_recently_used_is_evicted(
+        self, write: t.Any, tmp_path: pathlib.Path
+    ) -> None:
+        a = write(tmp_path / "a", "aaaa")
+        b = write(tmp_path / "b", "bbbb")
+        c = write(tmp_path / "c", "cccc")
+        cache = files.FileCache(max_size=8)
+        cache.read_lines(a)
+        cache.read_lines(b)
+        cache.read_lines(a)
+        cache.read_lines(c)
+        assert 3 == cache.misses
+
+        cache.read_lines(a)
+        assert 2 == cache.hits
+        cache.read_lines(b)
+        assert 4 == cache.misses
+
+    def test_files_over_the_limit_are_not_kept(
+        self, write: t.Any, tmp_path: pathlib.Path
+    ) -> None:
+        path = write(tmp_path / "big", "x" * 16)
+        cache = files.FileCache(max_size=8)
+        cache.read_lines(path)
+        cache.read_lines(path)
+        assert 0 == cache.hits
+
+    def test_pickles_empty(self, write: t.Any, tmp_path: pathlib.Path) -> None:
+        path = write(tmp_path / "a.hpp", "one\n")
+        cache = files.FileCache(max_size=100)
+        cache.read_lines(path)
+        copy = pickle.loads(pickle.dumps(cache))
+        assert 100 == copy.max_size
+        copy.read_lines(path)
+        assert 1 == copy.misses
+
+
+class TestMarkerIndex:
+    lines = [
+        "// ~begin-example\n",
+        "a\n",
+        "// ~end-example\n",
+        "// ~begin-example 2\n",
+        "b\n",
+        "// ~end\n",
+    ]
+
+    def test_find(self) -> None:
+        index = files.MarkerIndex(self.lines)
+        assert [0, 3] == index.find("// ~begin-example")
+        assert [3] == index.find("// ~begin-example 2")
+        assert [2, 5] == index.find("// ~end")
+        assert [] == index.find("// ~nothing")
+        assert [] == index.find("zzz")
+
+    def test_first_and_last(self) -> None:
+        index = files.MarkerIndex(self.lines)
+        assert 0 == index.first("// ~begin")
+        assert 3 == index.last("// ~begin")
+        assert index.first("nope") is None
+        assert index.last("nope") is None
+
+    def test_index_is_kept_with_cached_lines(
+        self, write: t.Any, tmp_path: pathlib.Path
+    ) -> None:
+        path = write(tmp_path / "a.hpp", "".join(self.lines))
+        cache = files.FileCache()
+        lines = cache.read_lines(path)
+        index = cache.marker_index(path, lines)
+        assert index is cache.marker_index(path, cache.read_lines(path))
+
+        write(tmp_path / "a.hpp", "changed\n")
+        lines = cache.read_lines(path)
+        assert index is not cache.marker_index(path, lines)
+
+    def test_no_index_for_lines_which_are_not_kept(
+        self, write: t.Any, tmp_path: pathlib.Path
+    ) -> None:
+        path = write(tmp_path / "a.hpp", "".join(self.lines))
+        cache = files.FileCache(max_size=1)
+        assert cache.marker_index(path, cache.read_lines(path)) is None
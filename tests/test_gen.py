@@ -0,0 +1,452 @@
+import os
+import pathlib
+import time
+import typing as t
+
+import pytest
+
+from mrst import cpp
+from mrst import deps
+from mrst import files
+from mrst import gen
+from mrst import pandoc
+from mrst import trace
+from mrst import vfs
+
+
+class TestIncrementalGenerate:
+    def _make_tree(self, write: t.Any, root: pathlib.Path) -> gen.Config:
+        src = root / "src"
+        write(src / "conf.py", "project = 'test'\n")
+        write(src / "plain.rst", "Plain\n=====\n")
+        write(src / "index.mrst", 'Index\n=====\n~dumpfile "part.txt"\n')
+        write(src / "part.txt", "part one\n")
+        return gen.Config(str(src), str(root / "out"), incremental=True)
+
+    def _age(self, cfg: gen.Config) -> t.Dict[str, float]:
+        """Pushes output mtimes into the past and returns them."""
+        result = {}
+        for name in ["plain.rst", "index.mrst"]:
+            path = os.path.join(cfg.gen_source_dir, name)
+            os.utime(path, (1000, 1000))
+            result[name] = os.path.getmtime(path)
+        return result
+
+    def test_unchanged_outputs_are_not_rewritten(
+        self, write: t.Any, tmp_path: pathlib.Path
+    ) -> None:
+        cfg = self._make_tree(write, tmp_path)
+        assert 0 == gen.generate(cfg)
+        before = self._age(cfg)
+
+        assert 0 == gen.generate(cfg)
+        for name, mtime in before.items():
+            path = os.path.join(cfg.gen_source_dir, name)
+            assert mtime == os.path.getmtime(path)
+
+    def test_changed_dumpfile_regenerates_its_page(
+        self, write: t.Any, tmp_path: pathlib.Path
+    ) -> None:
+        cfg = self._make_tree(write, tmp_path)
+        assert 0 == gen.generate(cfg)
+        before = self._age(cfg)
+
+        write(tmp_path / "src" / "part.txt", "part two\n")
+        assert 0 == gen.generate(cfg)
+
+        index = os.path.join(cfg.gen_source_dir, "index.mrst")
+        assert "part two" in pathlib.Path(index).read_text()
+        assert before["index.mrst"] != os.path.getmtime(index)
+        plain = os.path.join(cfg.gen_source_dir, "plain.rst")
+        assert before["plain.rst"] == os.path.getmtime(plain)
+
+    def test_deleted_source_removes_output(
+        self, write: t.Any, tmp_path: pathlib.Path
+    ) -> None:
+        cfg = self._make_tree(write, tmp_path)
+        assert 0 == gen.generate(cfg)
+
+        os.remove(tmp_path / "src" / "plain.rst")
+        assert 0 == gen.generate(cfg)
+        assert not os.path.exists(os.path.join(cfg.gen_source_dir, "plain.rst"))
+
+    def test_changed_conf_regenerates_everything(
+        self, write: t.Any, tmp_path: pathlib.Path
+    ) -> None:
+        cfg = self._make_tree(write, tmp_path)
+        assert 0 == gen.generate(cfg)
+        before = self._age(cfg)
+
+        write(tmp_path / "src" / "conf.py", "project = 'other'\n")
+        assert 0 == gen.generate(cfg)
+        for name, mtime in before.items():
+            path = os.path.join(cfg.gen_source_dir, name)
+            assert mtime != os.path.getmtime(path)
+
+
+def test_generate_records_dependency_graph(
+    write: t.Any, tmp_path: pathlib.Path
+) -> None:
+    src = tmp_path / "src"
+    write(src / "conf.py", "")
+    write(src / "index.mrst", '~dumpfile "api.hpp"\n')
+    write(src / "api.hpp", '// ~see-file "example.cpp"\n')
+    write(src / "example.cpp", "// ~begin-doc\nint x;\n// ~end-doc\n")
+    cfg = gen.Config(str(src), str(tmp_path / "out"))
+    assert 0 == gen.generate(cfg)
+
+    graph = deps.DependencyGraph.load(cfg.deps_file)
+    index = str(src / "index.mrst")
+    assert [index] == graph.affected_by(str(src / "example.cpp"))
+    assert [str(src / "api.hpp")] == graph.includers(str(src / "example.cpp"))
+    assert [
+        str(src / "api.hpp"),
+        str(src / "example.cpp"),
+    ] == graph.dependencies(index)
+
+
+class TestParallelGenerate:
+    def _make_tree(self, write: t.Any, root: pathlib.Path) -> pathlib.Path:
+        src = root / "src"
+        write(src / "conf.py", "")
+        for i in range(6):
+            write(src / f"page{i}.mrst", f'Page {i}\n~dumpfile "part.txt"\n')
+        write(src / "part.txt", "shared part\n")
+        write(src / "plain.rst", "Plain\n")
+        return src
+
+    def _read_gen(self, cfg: gen.Config) -> t.Dict[str, str]:
+        root = pathlib.Path(cfg.gen_source_dir)
+        return {p.name: p.read_text() for p in sorted(root.iterdir())}
+
+    def test_output_matches_serial(
+        self, write: t.Any, tmp_path: pathlib.Path
+    ) -> None:
+        src = self._make_tree(write, tmp_path)
+        serial = gen.Config(str(src), str(tmp_path / "serial"))
+        parallel = gen.Config(str(src), str(tmp_path / "parallel"), jobs=3)
+        assert 0 == gen.generate(serial)
+        assert 0 == gen.generate(parallel)
+        assert self._read_gen(serial) == self._read_gen(parallel)
+
+    def test_errors_are_reported_per_file(
+        self, write: t.Any, caplog: t.Any, tmp_path: pathlib.Path
+    ) -> None:
+        src = self._make_tree(write, tmp_path)
+        write(src / "broken.mrst", '~dumpfile "missing.txt"\n')
+        cfg = gen.Config(str(src), str(tmp_path / "out"), jobs=3)
+        assert 1 == gen.generate(cfg)
+
+        err = caplog.text
+        assert f"error generating {src / 'broken.mrst'}" in err
+        assert "missing.txt" in err
+        assert "page5.mrst" in self._read_gen(cfg)
+
+    def test_worker_spans_are_collected(
+        self, write: t.Any, tmp_path: pathlib.Path
+    ) -> None:
+        src = self._make_tree(write, tmp_path)
+        cfg = gen.Config(
+            str(src),
+            str(tmp_path / "out"),
+            jobs=3,
+            tracer=trace.Tracer(enabled=True),
+        )
+        assert 0 == gen.generate(cfg)
+
+        names = [span.name for span in cfg.tracer.spans]
+        assert 6 == names.count("parse_m_rst")
+        assert 6 == names.count("dumpfile")
+        assert 1 == names.count("copy")
+        assert "generate" == names[-1]
+
+
+def test_markdown_is_converted_in_one_batch(
+    write: t.Any, monkeypatch: t.Any, tmp_path: pathlib.Path
+) -> None:
+    calls = []
+
+    def fake_pandoc(fragments: t.List[str]) -> t.List[str]:
+        calls.append(fragments)
+        return [md.replace("md", "rst") for md in fragments]
+
+    monkeypatch.setattr(pandoc, "_run_pandoc_each", fake_pandoc)
+    src = tmp_path / "src"
+    write(src / "conf.py", "")
+    write(src / "README.md", "md title\n\nsome md\n")
+    write(src / "a.mrst", '~dumpfile "README.md" end=1\n')
+    write(src / "b.mrst", '~dumpfile "README.md" start=2\n')
+    cfg = gen.Config(str(src), str(tmp_path / "out"), cache_size=0)
+    assert 0 == gen.generate(cfg)
+
+    assert 1 == len(calls)
+    gen_dir = pathlib.Path(cfg.gen_source_dir)
+    assert "rst title" == (gen_dir / "a.mrst").read_text()
+    assert "some rst" == (gen_dir / "b.mrst").read_text()
+
+
+def test_current_time_is_pinned_per_build(
+    write: t.Any, tmp_path: pathlib.Path
+) -> None:
+    src = tmp_path / "src"
+    write(src / "conf.py", "")
+    write(src / "a.mrst", "~~current-time~~\n")
+    write(src / "b.mrst", "~~current-time~~\n")
+    cfg = gen.Config(str(src), str(tmp_path / "out"), jobs=2)
+    assert 0 == gen.generate(cfg)
+
+    gen_dir = pathlib.Path(cfg.gen_source_dir)
+    assert (gen_dir / "a.mrst").read_text() == (gen_dir / "b.mrst").read_text()
+
+
+def test_git_commit(write: t.Any, tmp_path: pathlib.Path) -> None:
+    src = tmp_path / "src"
+    write(tmp_path / ".git" / "HEAD", f"{'a' * 40}\n")
+    write(src / "conf.py", "")
+    write(src / "index.mrst", "Built from ~~git-commit~~.\n")
+    cfg = gen.Config(str(src), str(tmp_path / "out"))
+    assert 0 == gen.generate(cfg)
+
+    index = pathlib.Path(cfg.gen_source_dir) / "index.mrst"
+    assert f"Built from {'a' * 40}.\n" == index.read_text()
+
+
+class TestReadFile:
+    def _file(self, tmp_path: pathlib.Path) -> str:
+        path = tmp_path / "example.cpp"
+        path.write_text(
+            "// begin\nfirst\n// end\n// begin\nsecond\n// end\nlast\n"
+        )
+        return str(path)
+
+    def test_markers_use_last_match(self, tmp_path: pathlib.Path) -> None:
+        path = self._file(tmp_path)
+        for file_cache in [None, files.FileCache()]:
+            assert ["second\n"] == gen._read_file(
+                path,
+                None,
+                None,
+                start_after="// begin",
+                end_before="// end",
+                file_cache=file_cache,
+            )
+
+    def test_markers_are_scanned_for_without_a_cache(
+        self, monkeypatch: t.Any, tmp_path: pathlib.Path
+    ) -> None:
+        path = self._file(tmp_path)
+
+        def no_index(lines: t.List[str]) -> None:
+            raise AssertionError("an index is only built to be kept")
+
+        monkeypatch.setattr(files, "MarkerIndex", no_index)
+        assert ["last\n"] == gen._read_file(
+            path, None, None, start_after="// end"
+        )
+
+    def test_missing_marker_is_ignored(self, tmp_path: pathlib.Path) -> None:
+        path = self._file(tmp_path)
+        assert ["last\n"] == gen._read_file(
+            path, None, None, start_after="// end", end_before="// nope"
+        )
+
+
+def test_sync_leaves_unchanged_files_alone(
+    write: t.Any, tmp_path: pathlib.Path
+) -> None:
+    src = tmp_path / "src"
+    write(src / "conf.py", "")
+    write(src / "plain.rst", "Plain\n")
+    write(src / "old.rst", "Old\n")
+    cfg = gen.Config(str(src), str(tmp_path / "out"), sync=True)
+    assert 0 == gen.generate(cfg)
+    plain = pathlib.Path(cfg.gen_source_dir) / "plain.rst"
+    assert os.path.samefile(src / "plain.rst", plain)
+    mtime = plain.stat().st_mtime_ns
+
+    (src / "old.rst").unlink()
+    # Not incremental, so this would normally start from scratch.
+    assert 0 == gen.generate(cfg)
+    assert mtime == plain.stat().st_mtime_ns
+    assert ["conf.py", "plain.rst"] == sorted(
+        p.name for p in pathlib.Path(cfg.gen_source_dir).iterdir()
+    )
+
+
+def test_nested_and_excluded_files(
+    write: t.Any, tmp_path: pathlib.Path
+) -> None:
+    src = tmp_path / "src"
+    write(src / "conf.py", "exclude_patterns = ['drafts']\n")
+    write(src / ".mrstignore", "assets\n")
+    write(src / "guide" / "index.mrst", '~dumpfile "part.txt"\n')
+    write(src / "guide" / "part.txt", "part\n")
+    write(src / "drafts" / "wip.rst", "WIP\n")
+    write(src / "assets" / "logo.rst", "Logo\n")
+    cfg = gen.Config(str(src), str(tmp_path / "out"), skip_excluded=True)
+    assert 0 == gen.generate(cfg)
+
+    gen_dir = pathlib.Path(cfg.gen_source_dir)
+    assert "part" == (gen_dir / "guide" / "index.mrst").read_text()
+    assert not (gen_dir / "drafts").exists()
+    assert not (gen_dir / "assets").exists()
+
+
+def test_sphinx_excluded_files_are_copied(
+    write: t.Any, tmp_path: pathlib.Path
+) -> None:
+    # Sphinx skips them itself, but they may be pulled in with include.
+    src = tmp_path / "src"
+    write(src / "conf.py", "exclude_patterns = ['snippets/*']\n")
+    write(src / ".mrstignore", "assets\n")
+    write(src / "index.rst", ".. include:: snippets/a.rst\n")
+    write(src / "snippets" / "a.rst", "Snippet\n")
+    write(src / "assets" / "logo.rst", "Logo\n")
+    cfg = gen.Config(str(src), str(tmp_path / "out"))
+    assert 0 == gen.generate(cfg)
+
+    gen_dir = pathlib.Path(cfg.gen_source_dir)
+    assert "Snippet\n" == (gen_dir / "snippets" / "a.rst").read_text()
+    assert not (gen_dir / "assets").exists()
+
+
+class TestSeeFile:
+    def _generate(
+        self, tmp_path: pathlib.Path, **kwargs: t.Any
+    ) -> t.Tuple[gen.Config, int]:
+        cfg = gen.Config(str(tmp_path / "src"), str(tmp_path / "out"), **kwargs)
+        return cfg, gen.generate(cfg)
+
+    def test_shared_include_is_tokenized_once(
+        self, write: t.Any, monkeypatch: t.Any, tmp_path: pathlib.Path
+    ) -> None:
+        src = tmp_path / "src"
+        write(src / "conf.py", "")
+        write(src / "index.mrst", '~dumpfile "a.hpp"\n~dumpfile "b.hpp"\n')
+        write(src / "other.mrst", '~dumpfile "b.hpp"\n')
+        for name in ["a.hpp", "b.hpp"]:
+            write(src / name, '// ~see-file "shared.hpp"\n')
+        write(src / "shared.hpp", '// ~see-file "example.cpp"\n')
+        write(src / "example.cpp", "// ~begin-doc\nint x;\n// ~end-doc\n")
+
+        tokenized = []
+        iter_tokens = cpp.iter_tokens
+
+        def counting_iter_tokens(
+            lines: t.List[str], read_file: t.Any
+        ) -> t.Iterator[cpp.Token]:
+            tokenized.append("".join(lines))
+            return iter_tokens(lines, read_file)
+
+        monkeypatch.setattr(cpp, "iter_tokens", counting_iter_tokens)
+        cfg, result = self._generate(tmp_path)
+        assert 0 == result
+
+        # Both headers are tokenized each time they're dumped, but the
+        # files they include only once.
+        assert 1 == tokenized.count('// ~see-file "example.cpp"\n')
+        gen_dir = pathlib.Path(cfg.gen_source_dir)
+        code = ".. code-block:: c++\n\n    int x;\n"
+        assert 2 == (gen_dir / "index.mrst").read_text().count(code)
+        assert 1 == (gen_dir / "other.mrst").read_text().count(code)
+
+        # Reused includes still show up in the dependency graph.
+        graph = deps.DependencyGraph.load(cfg.deps_file)
+        assert [str(src / "index.mrst"), str(src / "other.mrst")] == (
+            graph.affected_by(str(src / "example.cpp"))
+        )
+
+    def test_cycle_is_an_error(
+        self, write: t.Any, caplog: t.Any, tmp_path: pathlib.Path
+    ) -> None:
+        src = tmp_path / "src"
+        write(src / "conf.py", "")
+        write(src / "index.mrst", '~dumpfile "a.hpp"\n')
+        write(src / "a.hpp", '// ~see-file "b.hpp"\n')
+        write(src / "b.hpp", '// ~see-file "a.hpp"\n')
+        _, result = self._generate(tmp_path)
+        assert 1 == result
+        assert "~see-file cycle:" in caplog.text
+
+    def test_max_include_depth(
+        self, write: t.Any, caplog: t.Any, tmp_path: pathlib.Path
+    ) -> None:
+        src = tmp_path / "src"
+        write(src / "conf.py", "")
+        write(src / "index.mrst", '~dumpfile "h0.hpp"\n')
+        for i in range(4):
+            write(src / f"h{i}.hpp", f'// ~see-file "h{i + 1}.hpp"\n')
+        write(src / "h4.hpp", "// nothing more\n")
+        _, result = self._generate(tmp_path, max_include_depth=4)
+        assert 0 == result
+        _, result = self._generate(tmp_path, max_include_depth=3)
+        assert 1 == result
+        assert "more than 3 deep" in caplog.text
+
+
+def test_failed_parse_leaves_output_alone(
+    write: t.Any, tmp_path: pathlib.Path
+) -> None:
+    source = tmp_path / "index.mrst"
+    write(source, 'Index\n=====\n~dumpfile "missing.txt"\n')
+    dst = tmp_path / "index.rst"
+    dst.write_text("Old\n")
+    with pytest.raises(FileNotFoundError):
+        gen.parse_m_rst(str(source), str(dst))
+    assert "Old\n" == dst.read_text()
+
+
+def test_markdown_converted_in_background_reaches_workers(
+    write: t.Any, monkeypatch: t.Any, tmp_path: pathlib.Path
+) -> None:
+    parent = os.getpid()
+
+    def fake_pandoc(markdown: str) -> str:
+        if os.getpid() != parent:
+            raise OSError("workers should have been given the results")
+        # Still running when the files would be handed out.
+        time.sleep(0.1)
+        return markdown.replace("md", "rst")
+
+    monkeypatch.setattr(pandoc, "_run_pandoc", fake_pandoc)
+    src = tmp_path / "src"
+    write(src / "conf.py", "")
+    write(src / "a.md", "a md\n")
+    write(src / "b.md", "![b md](b.png)\n")
+    write(src / "a.mrst", '~dumpfile "a.md"\n')
+    write(src / "b.mrst", '~dumpfile "b.md"\n')
+    cfg = gen.Config(str(src), str(tmp_path / "out"), jobs=2, cache_size=0)
+    assert 0 == gen.generate(cfg)
+
+    gen_dir = pathlib.Path(cfg.gen_source_dir)
+    assert "a rst" == (gen_dir / "a.mrst").read_text()
+    assert "![b rst](b.png)" == (gen_dir / "b.mrst").read_text()
+
+
+def test_generate_in_memory(tmp_path: pathlib.Path) -> None:
+    src = tmp_path / "src"
+    fs = vfs.MemoryFileSystem(
+        {
+            str(src / "conf.py"): "",
+            str(src / ".mrstignore"): "drafts\n",
+            str(src / "index.rst"): "Index\n",
+            str(src / "drafts" / "wip.rst"): "WIP\n",
+            str(src / "guide" / "api.mrst"): 'API\n~dumpfile "a.hpp"\n',
+            str(src / "guide" / "a.hpp"): '// ~see-file "b.cpp"\n',
+            str(src / "guide" / "b.cpp"): (
+                "// ~begin-doc\nint x;\n// ~end-doc\n"
+            ),
+        }
+    )
+    ctx = gen.Context(fs=fs)
+    rst, includes = gen.render_m_rst(str(src / "guide" / "api.mrst"), ctx)
+    assert "API\n.. code-block:: c++\n\n    int x;\n" == rst
+    assert str(src / "guide" / "b.cpp") in includes.files()
+
+    out = tmp_path / "out"
+    gen.copy_rst_files(str(src), str(out), jobs=2, ctx=ctx)
+    assert rst == fs.read_text(str(out / "guide" / "api.mrst"))
+    assert "Index\n" == fs.read_text(str(out / "index.rst"))
+    assert not fs.exists(str(out / "drafts"))
+    # Nothing was read from or written to the disk.
+    assert [] == list(tmp_path.iterdir())
@@ -0,0 +1,106 @@
+import pathlib
+import subprocess
+import typing as t
+
+import pytest
+
+from mrst import git
+
+
+SHA_1 = "1" * 40
+SHA_2 = "2" * 40
+
+
+class TestHeadCommit:
+    def test_detached(self, write: t.Any, tmp_path: pathlib.Path) -> None:
+        write(tmp_path / "HEAD", f"{SHA_1}\n")
+        assert SHA_1 == git.head_commit(str(tmp_path))
+
+    def test_loose_ref(self, write: t.Any, tmp_path: pathlib.Path) -> None:
+        write(tmp_path / "HEAD", "ref: refs/heads/main\n")
+        write(tmp_path / "refs" / "heads" / "main", f"{SHA_1}\n")
+        assert SHA_1 == git.head_commit(str(tmp_path))
+
+    def test_packed_ref(self, write: t.Any, tmp_path: pathlib.Path) -> None:
+        write(tmp_path / "HEAD", "ref: refs/heads/main\n")
+        write(
+            tmp_path / "packed-refs",
+            "# pack-refs with: peeled fully-peeled sorted\n"
+            f"{SHA_2} refs/heads/other\n"
+            f"{SHA_1} refs/heads/main\n"
+            f"^{SHA_2}\n",
+        )
+        assert SHA_1 == git.head_commit(str(tmp_path))
+
+    def test_worktree_uses_common_dir(
+        self, write: t.Any, tmp_path: pathlib.Path
+    ) -> None:
+        common = tmp_path / "repo" / ".git"
+        worktree = common / "worktrees" / "wt"
+        write(worktree / "HEAD", "ref: refs/heads/feature\n")
+        write(worktree / "commondir", "../..\n")
+        write(common / "refs" / "heads" / "feature", f"{SHA_2}\n")
+        write(tmp_path / "wt" / ".git", f"gitdir: {worktree}\n")
+
+        git_dir = git.find_git_dir(str(tmp_path / "wt"))
+        assert str(worktree) == git_dir
+        assert SHA_2 == git.head_commit(str(worktree))
+
+    def test_unknown_ref(self, write: t.Any, tmp_path: pathlib.Path) -> None:
+        write(tmp_path / "HEAD", "ref: refs/heads/.invalid\n")
+        assert git.head_commit(str(tmp_path)) is None
+
+
+def test_find_git_dir_walks_up(tmp_path: pathlib.Path) -> None:
+    (tmp_path / ".git").mkdir()
+    (tmp_path / "docs" / "source").mkdir(parents=True)
+    assert str(tmp_path / ".git") == git.find_git_dir(
+        str(tmp_path / "docs" / "source")
+    )
+
+
+def test_resolver_reads_each_repo_once(
+    write: t.Any, monkeypatch: t.Any, tmp_path: pathlib.Path
+) -> None:
+    write(tmp_path / ".git" / "HEAD", f"{SHA_1}\n")
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    calls = []
+    original = git.head_commit
+
+    def counting_head_commit(git_dir: str) -> t.Optional[str]:
+        calls.append(git_dir)
+        return original(git_dir)
+
+    monkeypatch.setattr(git, "head_commit", counting_head_commit)
+    resolver = git.CommitResolver()
+    assert SHA_1 == resolver.commit(str(tmp_path / "a"))
+    assert SHA_1 == resolver.commit(str(tmp_path / "b"))
+    assert 1 == len(calls)
+
+
+def test_resolver_matches_git(tmp_path: pathlib.Path) -> None:
+    try:
+        subprocess.check_call(["git", "init", "-q", str(tmp_path)])
+        subprocess.check_call(
+            [
+                "git",
+                "-c",
+                "user.name=t",
+                "-c",
+                "user.email=t@t",
+                "commit",
+                "-q",
+                "--allow-empty",
+                "-m",
+                "x",
+            ],
+            cwd=str(tmp_path),
+        )
+    except (OSError, subprocess.CalledProcessError):
+        pytest.skip("git is not available")
+    expected = subprocess.check_output(
+        ["git", "rev-parse", "HEAD"], cwd=str(tmp_path)
+    )
+    actual = git.CommitResolver().commit(str(tmp_path))
+    assert expected.decode("utf-8").strip() == actual
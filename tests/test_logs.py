@@ -0,0 +1,40 @@
+import json
+import logging
+import typing as t
+
+import pytest
+
+from mrst import logs
+
+
+def test_quiet_by_default(capsys: t.Any) -> None:
+    logs.configure()
+    logger = logging.getLogger("mrst.gen")
+    logger.info("parse a.mrst")
+    logger.error("error generating a.mrst")
+    assert "error generating a.mrst\n" == capsys.readouterr().err
+
+
+@pytest.mark.parametrize(
+    "verbosity, level",
+    [
+        (-2, logging.ERROR),
+        (-1, logging.ERROR),
+        (0, logging.WARNING),
+        (1, logging.INFO),
+        (2, logging.DEBUG),
+        (3, logging.DEBUG),
+    ],
+)
+def test_level_for(verbosity: int, level: int) -> None:
+    assert level == logs.level_for(verbosity)
+
+
+def test_json_format(capsys: t.Any) -> None:
+    logs.configure(1, json_format=True)
+    logging.getLogger("mrst.gen").info("parse %s", "a.mrst")
+    entry = json.loads(capsys.readouterr().err)
+    assert "info" == entry["level"]
+    assert "mrst.gen" == entry["logger"]
+    assert "parse a.mrst" == entry["message"]
+    assert (1, True) == logs.settings()
@@ -0,0 +1,191 @@
+import pathlib
+import shutil
+import subprocess
+import threading
+import typing as t
+
+import pytest
+
+from mrst import cache
+from mrst import pandoc
+
+
+class FakePandoc:
+    """Stands in for pandoc, "converting" by swapping md for rst.
+
+    ``calls`` has what each process was given; for a batch that's the
+    fragments joined by NUL characters.
+    """
+
+    def __init__(self, monkeypatch: t.Any) -> None:
+        self.calls: t.List[str] = []
+        monkeypatch.setattr(pandoc, "_run_pandoc", self)
+        monkeypatch.setattr(pandoc, "_run_pandoc_each", self.each)
+        monkeypatch.setattr(pandoc, "version", lambda: "pandoc 1.0")
+        self._monkeypatch = monkeypatch
+
+    def __call__(self, markdown: str) -> str:
+        self.calls.append(markdown)
+        return markdown.replace("md", "rst")
+
+    def each(self, fragments: t.List[str]) -> t.List[str]:
+        self.calls.append("\0".join(fragments))
+        return [md.replace("md", "rst") for md in fragments]
+
+
+@pytest.fixture
+def fake_pandoc(monkeypatch: t.Any) -> FakePandoc:
+    return FakePandoc(monkeypatch)
+
+
+def test_conversions_are_cached(
+    fake_pandoc: FakePandoc, monkeypatch: t.Any, tmp_path: pathlib.Path
+) -> None:
+    disk_cache = cache.DiskCache(str(tmp_path))
+    converter = pandoc.Converter(disk_cache)
+    assert ["some rst"] == converter.convert(["some md\n"])
+    assert ["some rst"] == converter.convert(["some md\n"])
+    assert 1 == len(fake_pandoc.calls)
+
+    # A fresh converter reads the entry back from disk.
+    assert ["some rst"] == pandoc.Converter(disk_cache).convert(["some md\n"])
+    assert 1 == len(fake_pandoc.calls)
+
+    monkeypatch.setattr(pandoc, "version", lambda: "pandoc 2.0")
+    assert ["some rst"] == pandoc.Converter(disk_cache).convert(["some md\n"])
+    assert 2 == len(fake_pandoc.calls)
+
+
+def test_results_in_memory_are_capped(fake_pandoc: FakePandoc) -> None:
+    converter = pandoc.Converter(max_results=2)
+    for md in ["a md\n", "b md\n", "a md\n", "c md\n"]:
+        converter.convert([md])
+    assert 3 == len(fake_pandoc.calls)
+    # "b" was used least recently, so it's gone.
+    assert ["b rst"] == converter.convert(["b md\n"])
+    assert 4 == len(fake_pandoc.calls)
+    assert ["a rst"] == converter.convert(["a md\n"])
+    assert 5 == len(fake_pandoc.calls)
+
+
+def test_start_all_uses_one_process(fake_pandoc: FakePandoc) -> None:
+    converter = pandoc.Converter()
+    fragments = [["first md\n", "\n", "more md\n"], ["second md\n"]]
+    converter.start_all(fragments + [["first md\n", "\n", "more md\n"]])
+    converter.wait()
+    assert 1 == len(fake_pandoc.calls)
+
+    assert ["first rst", "", "more rst"] == converter.convert(fragments[0])
+    assert ["second rst"] == converter.convert(fragments[1])
+    assert 1 == len(fake_pandoc.calls)
+
+
+def test_fragments_are_batched_whatever_they_hold(
+    fake_pandoc: FakePandoc,
+) -> None:
+    converter = pandoc.Converter()
+    converter.start_all(
+        [
+            ["a md\n"],
+            ["# Usage\n"],
+            ["Usage\n", "-----\n"],
+            ["[foo][]\n", "\n", "[foo]: https://example.com\n"],
+            ["![img](x.png)\n"],
+            ["% Title\n"],
+            ["(@) example\n"],
+            ["a\ttab md\n"],
+        ]
+    )
+    converter.wait()
+    assert 2 == len(fake_pandoc.calls)
+    batch = fake_pandoc.calls[0].split("\0")
+    assert 7 == len(batch)
+    # pandoc.read doesn't expand tabs the way pandoc does.
+    assert "a\ttab md\n" == fake_pandoc.calls[1]
+
+
+@pytest.mark.skipif(shutil.which("pandoc") is None, reason="needs pandoc")
+def test_batched_output_matches_solo_output() -> None:
+    fragments = [
+        ["% A Title\n", "\n", "Some *emphasis*.\n"],
+        ["# Usage\n", "\n", "Call it.\n"],
+        ["# Usage\n", "\n", "Call it again.\n"],
+        ["See [foo].\n", "\n", "[foo]: https://one.example.com\n"],
+        ["See [foo].\n", "\n", "[foo]: https://two.example.com\n"],
+        ["A note.[^1]\n", "\n", "[^1]: The note.\n"],
+        ["![An image](a.png)\n"],
+        ["(@) An example.\n"],
+        ["```cpp\n", "#include <x>\n", "```\n"],
+        ["- a list\n", "- of things\n"],
+    ]
+    batched = pandoc.Converter()
+    batched.start_all(fragments)
+    batched.wait()
+    assert batched._batching
+    for fragment in fragments:
+        solo = pandoc.Converter().convert(fragment)
+        assert solo == batched.convert(fragment)
+
+
+def test_failed_batch_falls_back_to_single_runs(
+    fake_pandoc: FakePandoc, monkeypatch: t.Any
+) -> None:
+    def old_pandoc(fragments: t.List[str]) -> t.List[str]:
+        fake_pandoc.calls.append("\0".join(fragments))
+        raise subprocess.CalledProcessError(64, ["pandoc", "lua"])
+
+    monkeypatch.setattr(pandoc, "_run_pandoc_each", old_pandoc)
+    converter = pandoc.Converter()
+    converter.start_all([["a md\n"], ["b md\n"]])
+    assert ["a rst"] == converter.convert(["a md\n"])
+    converter.wait()
+    assert ["a md\n", "a md\n\0b md\n", "b md\n"] == sorted(fake_pandoc.calls)
+
+    # Batching isn't tried again.
+    converter.start_all([["c md\n"], ["d md\n"]])
+    converter.wait()
+    assert 5 == len(fake_pandoc.calls)
+
+
+def test_start_all_converts_in_the_background(fake_pandoc: FakePandoc) -> None:
+    converter = pandoc.Converter()
+    fragments = [["a md\n"], ["b md\n"], ["a\ttab md\n"]]
+    converter.start_all(fragments)
+    # One batch, and one run for the fragment with a tab.
+    converter.wait()
+    assert 2 == len(fake_pandoc.calls)
+
+    assert ["a rst"] == converter.convert(fragments[0])
+    assert ["a\ttab rst"] == converter.convert(fragments[2])
+    assert 2 == len(fake_pandoc.calls)
+
+
+def test_convert_waits_for_a_started_run(
+    fake_pandoc: FakePandoc, monkeypatch: t.Any
+) -> None:
+    release = threading.Event()
+
+    def slow_pandoc(markdown: str) -> str:
+        release.wait(10)
+        return fake_pandoc(markdown)
+
+    monkeypatch.setattr(pandoc, "_run_pandoc", slow_pandoc)
+    converter = pandoc.Converter()
+    converter.start_all([["a md\n"]])
+    assert [] == fake_pandoc.calls
+    release.set()
+    assert ["a rst"] == converter.convert(["a md\n"])
+    assert 1 == len(fake_pandoc.calls)
+
+
+def test_failed_background_run_is_retried(
+    fake_pandoc: FakePandoc, monkeypatch: t.Any
+) -> None:
+    def broken_pandoc(markdown: str) -> str:
+        raise OSError("no pandoc")
+
+    monkeypatch.setattr(pandoc, "_run_pandoc", broken_pandoc)
+    converter = pandoc.Converter()
+    converter.start_all([["a md\n"]])
+    with pytest.raises(OSError):
+        converter.convert(["a md\n"])
@@ -0,0 +1,85 @@
+import pickle
+import subprocess
+import sys
+import threading
+import time
+import typing as t
+
+import pytest
+
+from mrst import procs
+from mrst import trace
+
+
+def test_run_returns_output() -> None:
+    engine = procs.Engine()
+    try:
+        script = "import sys; sys.stdout.write(sys.stdin.read().upper())"
+        output = engine.call(
+            procs.run, [sys.executable, "-c", script], "some text"
+        )
+        assert "SOME TEXT" == output
+    finally:
+        engine.close()
+
+
+def test_run_raises_on_failure() -> None:
+    engine = procs.Engine()
+    try:
+        with pytest.raises(subprocess.CalledProcessError):
+            engine.call(procs.run, [sys.executable, "-c", "exit(3)"])
+    finally:
+        engine.close()
+
+
+def test_limit_is_respected() -> None:
+    engine = procs.Engine(limit=2)
+    lock = threading.Lock()
+    running = []
+    most = []
+
+    def job() -> int:
+        with lock:
+            running.append(1)
+            most.append(len(running))
+        time.sleep(0.01)
+        with lock:
+            running.pop()
+            return len(most)
+
+    try:
+        results = [engine.submit(job) for _ in range(6)]
+        assert 6 == len([f.result() for f in results])
+        assert 2 == max(most)
+    finally:
+        engine.close()
+
+
+def test_spans_cover_the_call() -> None:
+    tracer = trace.Tracer(enabled=True)
+    engine = procs.Engine()
+    try:
+        span = tracer.span("job", "subprocess")
+        assert 5 == engine.call(lambda: 5, span=span)
+    finally:
+        engine.close()
+    assert ["job"] == [s.name for s in tracer.spans]
+
+
+def test_closed_engine_starts_again() -> None:
+    engine = procs.Engine()
+    job: t.Callable[[int], int] = lambda x: x + 1
+    assert 2 == engine.call(job, 1)
+    engine.close()
+    assert 3 == engine.call(job, 2)
+    engine.close()
+
+
+def test_engine_pickles_without_its_threads() -> None:
+    engine = procs.Engine(limit=3)
+    engine.call(lambda: None)
+    try:
+        copy = pickle.loads(pickle.dumps(engine))
+        assert 3 == copy.limit
+    finally:
+        engine.close()
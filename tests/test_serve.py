@@ -0,0 +1,135 @@
+import os
+import pathlib
+import threading
+import typing as t
+
+from mrst import deps
+from mrst import gen
+from mrst import manifest
+from mrst import serve
+
+
+def _make_tree(write: t.Any, root: pathlib.Path) -> gen.Config:
+    src = root / "src"
+    write(src / "conf.py", "project = 'test'\n")
+    write(src / "index.mrst", 'Index\n=====\n~dumpfile "part.txt"\n')
+    write(src / "part.txt", "part one\n")
+    write(src / "api.hpp", '// ~see-file "more.hpp"\n')
+    write(
+        src / "more.hpp",
+        "// ---------\n// More\n// =========\n//    Text\n// ---------/\n",
+    )
+    return gen.Config(str(src), str(root / "out"))
+
+
+class TestServer:
+    def test_generate_reports_changed_files(
+        self, write: t.Any, tmp_path: pathlib.Path
+    ) -> None:
+        cfg = _make_tree(write, tmp_path)
+        server = serve.Server(cfg)
+        index = os.path.join(cfg.gen_source_dir, "index.mrst")
+
+        response = server.handle({"op": "generate"})
+        assert response["ok"]
+        assert index in response["changed"]
+        assert [] == response["errors"]
+
+        assert [] == server.handle({"op": "generate"})["changed"]
+
+        write(tmp_path / "src" / "part.txt", "part two\n")
+        assert [index] == server.handle({"op": "generate"})["changed"]
+        assert "part two" in pathlib.Path(index).read_text()
+
+    def test_nested_include_change(
+        self, write: t.Any, tmp_path: pathlib.Path
+    ) -> None:
+        cfg = _make_tree(write, tmp_path)
+        src = tmp_path / "src"
+        write(src / "nested.mrst", '~dumpfile "a.hpp"\n')
+        write(src / "a.hpp", '// ~see-file "b.hpp"\n')
+        write(src / "b.hpp", '// ~see-file "c.hpp"\n')
+        write(src / "c.hpp", "// ~begin-doc\nint old;\n// ~end-doc\n")
+        server = serve.Server(cfg)
+        nested = os.path.join(cfg.gen_source_dir, "nested.mrst")
+        assert server.handle({"op": "generate"})["ok"]
+
+        write(src / "c.hpp", "// ~begin-doc\nint changed;\n// ~end-doc\n")
+        assert [nested] == server.handle({"op": "generate"})["changed"]
+        assert "int changed;" in pathlib.Path(nested).read_text()
+
+    def test_records_stay_in_memory(
+        self, write: t.Any, monkeypatch: t.Any, tmp_path: pathlib.Path
+    ) -> None:
+        server = serve.Server(_make_tree(write, tmp_path))
+        assert server.handle({"op": "generate"})["ok"]
+
+        def no_load(path: str) -> None:
+            raise AssertionError(f"{path} was loaded again")
+
+        hashed = []
+        file_digest = manifest.file_digest
+
+        def digest(path: str) -> t.Optional[str]:
+            hashed.append(os.path.basename(path))
+            return file_digest(path)
+
+        monkeypatch.setattr(manifest.Manifest, "load", no_load)
+        monkeypatch.setattr(deps.DependencyGraph, "load", no_load)
+        monkeypatch.setattr(manifest, "file_digest", digest)
+        assert [] == server.handle({"op": "generate"})["changed"]
+        # Only conf.py is hashed; unchanged inputs are checked by stamp.
+        assert ["conf.py", "conf.py"] == hashed
+
+    def test_generate_reports_errors(
+        self, write: t.Any, tmp_path: pathlib.Path
+    ) -> None:
+        cfg = _make_tree(write, tmp_path)
+        (tmp_path / "src" / "part.txt").unlink()
+        response = serve.Server(cfg).handle({"op": "generate"})
+        assert not response["ok"]
+        assert 1 == len(response["errors"])
+        assert "index.mrst" in response["errors"][0]
+
+    def test_translate(self, write: t.Any, tmp_path: pathlib.Path) -> None:
+        cfg = _make_tree(write, tmp_path)
+        server = serve.Server(cfg)
+        for _ in range(2):
+            response = server.handle({"op": "translate", "args": '"api.hpp"'})
+            assert response["ok"]
+            assert "More\n====\nText\n" == response["rst"]
+            assert [
+                str(tmp_path / "src" / "api.hpp"),
+                str(tmp_path / "src" / "more.hpp"),
+            ] == response["files"]
+        # The included header was only tokenized once.
+        assert 1 == len(server.ctx.include_memo)
+
+    def test_bad_requests(self, write: t.Any, tmp_path: pathlib.Path) -> None:
+        server = serve.Server(_make_tree(write, tmp_path))
+        response = server.handle({"op": "nonsense"})
+        assert not response["ok"]
+        assert "unknown op: nonsense" == response["error"]
+
+        response = server.handle({"op": "translate", "args": '"missing.md"'})
+        assert not response["ok"]
+        assert response["error"].startswith("FileNotFoundError")
+
+
+def test_serve_over_socket(write: t.Any, tmp_path: pathlib.Path) -> None:
+    cfg = _make_tree(write, tmp_path)
+    address = str(tmp_path / "mrst.sock")
+    ready = threading.Event()
+    thread = threading.Thread(
+        target=serve.serve, args=(cfg, address), kwargs={"ready": ready.set}
+    )
+    thread.start()
+    try:
+        assert ready.wait(10)
+        assert serve.request(address, {"op": "ping"})["ok"]
+        assert serve.request(address, {"op": "generate"})["ok"]
+    finally:
+        assert serve.request(address, {"op": "shutdown"})["ok"]
+        thread.join(10)
+    assert not thread.is_alive()
+    assert not os.path.exists(address)
@@ -0,0 +1,65 @@
+import json
+import pathlib
+import pickle
+
+from mrst import trace
+
+
+def test_disabled_tracer_records_nothing() -> None:
+    tracer = trace.Tracer()
+    with tracer.span("parse_m_rst", "file", file="a.mrst"):
+        pass
+    assert [] == tracer.spans
+
+
+def test_spans_are_recorded() -> None:
+    tracer = trace.Tracer(enabled=True)
+    with tracer.span("generate", "phase"):
+        with tracer.span("parse_m_rst", "file", file="a.mrst"):
+            pass
+    inner, outer = tracer.spans
+    assert "parse_m_rst" == inner.name
+    assert {"file": "a.mrst"} == inner.args
+    assert "generate" == outer.name
+    assert outer.start <= inner.start
+    assert outer.duration >= inner.duration
+
+
+def test_pickled_tracer_starts_empty() -> None:
+    tracer = trace.Tracer(enabled=True)
+    with tracer.span("generate", "phase"):
+        pass
+    copy = pickle.loads(pickle.dumps(tracer))
+    assert copy.enabled
+    assert [] == copy.spans
+
+
+def test_chrome_trace(tmp_path: pathlib.Path) -> None:
+    tracer = trace.Tracer(enabled=True)
+    with tracer.span("pandoc", "subprocess", fragments=2):
+        pass
+    path = tmp_path / "trace.json"
+    tracer.write_chrome_trace(str(path))
+
+    (event,) = json.loads(path.read_text())["traceEvents"]
+    assert "pandoc" == event["name"]
+    assert "subprocess" == event["cat"]
+    assert "X" == event["ph"]
+    assert {"fragments": 2} == event["args"]
+    assert event["dur"] >= 0
+
+
+def test_summary_lists_slowest_spans() -> None:
+    tracer = trace.Tracer(enabled=True)
+    tracer.spans = [
+        trace.Span("parse_m_rst", "file", 0, 1000, {"file": "fast.mrst"}),
+        trace.Span("parse_m_rst", "file", 0, 5000, {"file": "slow.mrst"}),
+        trace.Span("generate", "phase", 0, 9000, {}),
+    ]
+    lines = tracer.summary(limit=1)
+    assert "total time by span:" == lines[0]
+    assert "generate (x1)" in lines[1]
+    assert "parse_m_rst (x2)" in lines[2]
+    assert "slowest file spans:" == lines[3]
+    assert lines[4].endswith("parse_m_rst file=slow.mrst")
+    assert 5 == len(lines)
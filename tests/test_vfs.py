@@ -0,0 +1,108 @@
+import os
+import pathlib
+import pickle
+
+import pytest
+
+from mrst import files
+from mrst import vfs
+
+
+class TestMemoryFileSystem:
+    def test_read_and_write(self) -> None:
+        fs = vfs.MemoryFileSystem({"src/a.txt": "one\ntwo\n"})
+        assert ["one\n", "two\n"] == fs.read_lines("src/a.txt")
+        assert "one\ntwo\n" == fs.read_text(os.path.abspath("src/a.txt"))
+        assert not fs.write_text("src/a.txt", "one\ntwo\n")
+        stamp = fs.stamp("src/a.txt")
+        assert fs.write_text("src/a.txt", "three\n")
+        assert stamp != fs.stamp("src/a.txt")
+        with pytest.raises(FileNotFoundError):
+            fs.read_text("src/b.txt")
+
+    def test_directories(self) -> None:
+        fs = vfs.MemoryFileSystem({"/src/a.txt": "", "/src/sub/b.txt": ""})
+        fs.makedirs("/src/empty")
+        assert [("a.txt", False), ("empty", True), ("sub", True)] == (
+            fs.listdir("/src")
+        )
+        assert fs.exists("/src/sub") and fs.exists("/src/sub/b.txt")
+        fs.remove("/src/sub/b.txt")
+        assert not fs.exists("/src/sub/b.txt")
+        with pytest.raises(FileNotFoundError):
+            fs.remove("/src/sub/b.txt")
+        with pytest.raises(FileNotFoundError):
+            fs.listdir("/missing")
+
+    def test_file_cache_reads_through_it(self) -> None:
+        fs = vfs.MemoryFileSystem({"/a.txt": "old\n"})
+        cache = files.FileCache(fs=fs)
+        assert ["old\n"] == cache.read_lines("/a.txt")
+        fs.write_text("/a.txt", "new\n")
+        assert ["new\n"] == cache.read_lines("/a.txt")
+        copy = pickle.loads(pickle.dumps(cache))
+        assert ["new\n"] == copy.read_lines("/a.txt")
+
+
+class TestSyncFile:
+    def test_copies_missing_file(self, tmp_path: pathlib.Path) -> None:
+        src = tmp_path / "a.rst"
+        src.write_text("text\n")
+        os.utime(src, (1000, 1000))
+        dst = tmp_path / "out.rst"
+        assert vfs.sync_file(str(src), str(dst))
+        assert "text\n" == dst.read_text()
+        assert 1000 == dst.stat().st_mtime
+
+    def test_identical_file_is_left_alone(self, tmp_path: pathlib.Path) -> None:
+        src = tmp_path / "a.rst"
+        src.write_text("text\n")
+        dst = tmp_path / "out.rst"
+        dst.write_text("text\n")
+        os.utime(dst, (1000, 1000))
+        assert not vfs.sync_file(str(src), str(dst))
+        assert 1000 == dst.stat().st_mtime
+
+    def test_changed_file_is_replaced(self, tmp_path: pathlib.Path) -> None:
+        src = tmp_path / "a.rst"
+        src.write_text("new\n")
+        dst = tmp_path / "out.rst"
+        dst.write_text("old\n")
+        assert vfs.sync_file(str(src), str(dst))
+        assert "new\n" == dst.read_text()
+        assert [] == list(tmp_path.glob("*.tmp"))
+
+    def test_link(self, tmp_path: pathlib.Path) -> None:
+        src = tmp_path / "a.rst"
+        src.write_text("text\n")
+        dst = tmp_path / "out.rst"
+        assert vfs.sync_file(str(src), str(dst), link=True)
+        assert "text\n" == dst.read_text()
+        assert os.path.samefile(src, dst)
+        # Linked files are already in sync.
+        assert not vfs.sync_file(str(src), str(dst), link=True)
+
+
+class TestWriteIfChanged:
+    def test_writes_missing_file(self, tmp_path: pathlib.Path) -> None:
+        dst = tmp_path / "out.rst"
+        assert vfs.write_if_changed(str(dst), "text\n")
+        assert "text\n" == dst.read_text()
+
+    def test_same_text_is_left_alone(self, tmp_path: pathlib.Path) -> None:
+        dst = tmp_path / "out.rst"
+        dst.write_text("text\n")
+        os.utime(dst, (1000, 1000))
+        assert not vfs.write_if_changed(str(dst), "text\n")
+        assert 1000 == dst.stat().st_mtime
+
+    def test_failed_write_leaves_file_alone(
+        self, tmp_path: pathlib.Path
+    ) -> None:
+        dst = tmp_path / "out.rst"
+        dst.write_text("old\n")
+        with pytest.raises(UnicodeEncodeError):
+            # A lone surrogate can't be encoded.
+            vfs.write_if_changed(str(dst), "new\n\ud800")
+        assert "old\n" == dst.read_text()
+        assert [] == list(tmp_path.glob("*.tmp"))
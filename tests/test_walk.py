@@ -0,0 +1,78 @@
+import os
+import pathlib
+
+import pytest
+
+from mrst import walk
+
+
+def _touch(path: pathlib.Path, text: str = "") -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+
+
+@pytest.mark.parametrize(
+    "path, pattern, expected",
+    [
+        ("_build", "_build", True),
+        ("docs/_build", "_build", False),
+        ("docs/_build", "**/_build", True),
+        ("a.rst", "*.rst", True),
+        ("sub/a.rst", "*.rst", False),
+        ("sub/a.rst", "**.rst", True),
+        ("a1.rst", "a?.rst", True),
+        ("a1.rst", "a[0-9].rst", True),
+        ("ab.rst", "a[!0-9].rst", True),
+        ("a1.rst", "a[!0-9].rst", False),
+    ],
+)
+def test_matches(path: str, pattern: str, expected: bool) -> None:
+    assert expected == walk.matches(path, [pattern])
+
+
+def test_conf_exclude_patterns(tmp_path: pathlib.Path) -> None:
+    conf = tmp_path / "conf.py"
+    _touch(
+        conf,
+        "import os\n"
+        "project = 'x'\n"
+        "exclude_patterns = ['_build', 'Thumbs.db']\n"
+        "exclude_patterns += ['drafts/**']\n"
+        "templates_path = [os.path.join('a', 'b')]\n",
+    )
+    assert ["_build", "Thumbs.db", "drafts/**"] == walk.conf_exclude_patterns(
+        str(conf)
+    )
+
+
+def test_conf_exclude_patterns_missing_or_dynamic(
+    tmp_path: pathlib.Path,
+) -> None:
+    assert [] == walk.conf_exclude_patterns(str(tmp_path / "conf.py"))
+    conf = tmp_path / "conf.py"
+    _touch(conf, "exclude_patterns = make_patterns()\n")
+    assert [] == walk.conf_exclude_patterns(str(conf))
+
+
+def test_walk_files(tmp_path: pathlib.Path) -> None:
+    src = tmp_path / "src"
+    _touch(src / "conf.py", "exclude_patterns = ['_build']\n")
+    _touch(src / walk.IGNORE_FILE, "# comment\n\nassets/\n")
+    _touch(src / "index.mrst")
+    _touch(src / "a.rst")
+    _touch(src / "guide" / "b.rst")
+    _touch(src / "guide" / "image.png")
+    _touch(src / "_build" / "c.rst")
+    _touch(src / "assets" / "d.rst")
+    _touch(src / ".hidden" / "e.rst")
+    _touch(src / ".f.rst")
+
+    assert ["assets"] == walk.exclude_patterns(str(src))
+    exclude = walk.exclude_patterns(str(src), use_conf=True)
+    assert ["_build", "assets"] == exclude
+    assert [
+        "a.rst",
+        os.path.join("guide", "b.rst"),
+        "index.mrst",
+    ] == walk.walk_files(str(src), walk.DOC_PATTERNS, exclude)
+    assert os.path.join("guide", "image.png") in walk.walk_files(str(src))
@@ -0,0 +1,148 @@
+import os
+import pathlib
+import typing as t
+
+from mrst import deps
+from mrst import gen
+from mrst import walk
+from mrst import watch
+
+
+def _bump(path: pathlib.Path, text: str) -> None:
+    # Make sure the change shows up even on coarse mtime filesystems.
+    path.write_text(text)
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+
+class FakeClock:
+    """Runs an action at given sleeps and stops the watch afterwards."""
+
+    def __init__(self, actions: t.Dict[int, t.Callable[[], None]]) -> None:
+        self.actions = actions
+        self.sleeps = 0
+
+    def sleep(self, _seconds: float) -> None:
+        self.sleeps += 1
+        action = self.actions.get(self.sleeps)
+        if action:
+            action()
+
+    def should_stop(self) -> bool:
+        return self.sleeps >= max(self.actions) + 3
+
+
+class TestWatch:
+    def _make_tree(self, write: t.Any, root: pathlib.Path) -> gen.Config:
+        src = root / "src"
+        write(src / "conf.py", "")
+        write(src / "index.mrst", '~dumpfile "../shared/part.txt"\n')
+        write(src / "other.mrst", "other\n")
+        write(root / "shared" / "part.txt", "part one\n")
+        return gen.Config(str(src), str(root / "out"))
+
+    def _watch(self, cfg: gen.Config, clock: FakeClock) -> t.List[str]:
+        """Returns the index page's contents after each build."""
+        outputs = []
+
+        def build(config: gen.Config) -> int:
+            result = gen.generate(config)
+            index = os.path.join(config.gen_source_dir, "index.mrst")
+            with open(index) as r:
+                outputs.append(r.read())
+            return result
+
+        watch.watch(
+            cfg, build, should_stop=clock.should_stop, sleep=clock.sleep
+        )
+        return outputs
+
+    def test_included_file_outside_source_is_watched(
+        self, write: t.Any, tmp_path: pathlib.Path
+    ) -> None:
+        cfg = self._make_tree(write, tmp_path)
+        part = tmp_path / "shared" / "part.txt"
+        clock = FakeClock({2: lambda: _bump(part, "part two\n")})
+        assert ["part one", "part two"] == self._watch(cfg, clock)
+        assert cfg.incremental
+
+    def test_burst_of_changes_builds_once(
+        self, write: t.Any, tmp_path: pathlib.Path
+    ) -> None:
+        cfg = self._make_tree(write, tmp_path)
+        part = tmp_path / "shared" / "part.txt"
+        clock = FakeClock(
+            {
+                2: lambda: _bump(part, "part two\n"),
+                3: lambda: _bump(part, "part three\n"),
+                4: lambda: _bump(tmp_path / "src" / "new.mrst", "new\n"),
+            }
+        )
+        assert ["part one", "part three"] == self._watch(cfg, clock)
+        assert (pathlib.Path(cfg.gen_source_dir) / "new.mrst").exists()
+
+    def test_file_no_longer_included_is_dropped_quietly(
+        self, write: t.Any, tmp_path: pathlib.Path
+    ) -> None:
+        cfg = self._make_tree(write, tmp_path)
+        index = tmp_path / "src" / "index.mrst"
+        clock = FakeClock({2: lambda: _bump(index, "index\n")})
+        assert ["part one", "index\n"] == self._watch(cfg, clock)
+
+    def test_nothing_changed(
+        self, write: t.Any, tmp_path: pathlib.Path
+    ) -> None:
+        cfg = self._make_tree(write, tmp_path)
+        clock = FakeClock({5: lambda: None})
+        assert ["part one"] == self._watch(cfg, clock)
+
+
+class TestWatchedFiles:
+    def test_tree_is_only_walked_again_when_it_changes(
+        self, write: t.Any, monkeypatch: t.Any, tmp_path: pathlib.Path
+    ) -> None:
+        src = tmp_path / "src"
+        write(src / "conf.py", "")
+        write(src / "guide" / "index.mrst", "index\n")
+        cfg = gen.Config(str(src), str(tmp_path / "out"))
+        walks = []
+        walk_tree = walk.walk_tree
+
+        def counting_walk_tree(*args: t.Any, **kwargs: t.Any) -> t.Any:
+            walks.append(args)
+            return walk_tree(*args, **kwargs)
+
+        loads = []
+        load = deps.DependencyGraph.load
+
+        def counting_load(path: str) -> deps.DependencyGraph:
+            loads.append(path)
+            return load(path)
+
+        monkeypatch.setattr(walk, "walk_tree", counting_walk_tree)
+        monkeypatch.setattr(deps.DependencyGraph, "load", counting_load)
+        watched = watch.WatchedFiles(cfg)
+        for _ in range(3):
+            assert [
+                str(src / "conf.py"),
+                str(src / "guide" / "index.mrst"),
+            ] == (watched.files())
+        assert 1 == len(walks)
+
+        write(src / "guide" / "new.mrst", "new\n")
+        assert str(src / "guide" / "new.mrst") in watched.files()
+        assert 2 == len(walks)
+
+        _bump(src / walk.IGNORE_FILE, "guide\n")
+        assert [str(src / "conf.py")] == watched.files()
+        assert 3 == len(walks)
+        assert 1 == len(loads)
+
+        watched.refresh()
+        assert 2 == len(loads)
+
+
+def test_changes() -> None:
+    old: watch.Snapshot = {"a": (1, 1), "b": (1, 1), "c": (1, 1)}
+    new: watch.Snapshot = {"a": (1, 1), "b": (2, 1), "d": (1, 1)}
+    assert {"b", "c", "d"} == watch.changes(old, new)